@@ -33,6 +33,22 @@ class Config:
             # Fallback vers les variables d'environnement
             return os.getenv('SECRET_KEY')
     
+    @classmethod
+    def get_gist_id(cls):
+        """Récupère l'ID du Gist de stockage depuis les secrets ou l'environnement"""
+        try:
+            return st.secrets['GIST_ID']
+        except (KeyError, AttributeError, Exception):
+            return os.getenv('GIST_ID')
+    
+    @classmethod
+    def get_gist_token(cls):
+        """Récupère le token GitHub (scope gist) depuis les secrets ou l'environnement"""
+        try:
+            return st.secrets['GIST_TOKEN']
+        except (KeyError, AttributeError, Exception):
+            return os.getenv('GIST_TOKEN')
+    
     @property
     def OPENAI_API_KEY(self):
         return self.get_openai_key()
@@ -45,6 +61,17 @@ class Config:
     OUTPUT_DIR = 'output'
     TOKEN_PATH = 'token.json'
     CREDENTIALS_PATH = 'credentials.json'
+    CACHE_DIR = os.getenv('AUTOBRIEF_CACHE_DIR', '.cache')
+    
+    # Cache disque des contenus d'emails nettoyés (éviction LRU au-delà de cette taille)
+    BODY_CACHE_MAX_BYTES = 50 * 1024 * 1024
+    
+    # Stockage des données utilisateur : 'gist' (Gist GitHub partagé) ou 'sqlite' (base locale)
+    USER_DATA_BACKEND = os.getenv('AUTOBRIEF_STORAGE_BACKEND', 'gist')
+    USER_DATA_DB_PATH = os.getenv('AUTOBRIEF_DB_PATH', 'user_data.sqlite3')
+    
+    # Interface : délai (secondes) de regroupement des sauvegardes avant l'envoi en arrière-plan
+    SAVE_DEBOUNCE_SECONDS = 2
     
     # Scopes Gmail
     SCOPES = [
@@ -53,6 +80,81 @@ class Config:
     ]
     
     
+    # OpenAI : modèle utilisé pour les résumés et nombre d'appels simultanés (phase map)
+    OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+    SUMMARY_MAX_CONCURRENCY = 4
+    
+    # Budget de tokens : fenêtre de contexte par modèle, réserve pour la réponse
+    # et plafond de tokens de contenu par appel (borne la latence de chaque appel)
+    OPENAI_CONTEXT_WINDOWS = {
+        'gpt-3.5-turbo': 16385,
+        'gpt-4o-mini': 128000,
+        'gpt-4o': 128000,
+        'gpt-4.1-mini': 1047576,
+        'gpt-4.1-nano': 1047576,
+    }
+    DEFAULT_CONTEXT_WINDOW = 16385
+    SUMMARY_MAX_OUTPUT_TOKENS = 2000
+    SUMMARY_MAX_INPUT_TOKENS = int(os.getenv('SUMMARY_MAX_INPUT_TOKENS', 6000))
+    
+    # Cache local des réponses OpenAI (clé : modèle + prompt complet + prompt personnalisé)
+    LLM_CACHE_TTL = 7 * 24 * 3600
+    LLM_CACHE_MAX_BYTES = 20 * 1024 * 1024
+    
+    # Actualités extraites par email, mémorisées par empreinte du contenu normalisé
+    EMAIL_ITEMS_CACHE_TTL = 30 * 24 * 3600
+    EMAIL_ITEMS_CACHE_MAX_BYTES = 50 * 1024 * 1024
+    
+    # Résolution des liens de redirection : URLs finales mémorisées, résolutions simultanées,
+    # délai par requête (secondes) et octets lus au plus pour chercher une redirection dans la page
+    URL_CACHE_TTL = 7 * 24 * 3600
+    URL_CACHE_MAX_BYTES = 5 * 1024 * 1024
+    URL_RESOLVE_CONCURRENCY = 8
+    URL_RESOLVE_TIMEOUT = 5
+    URL_RESOLVE_MAX_BYTES = 64 * 1024
+    
+    # Services Gmail construits conservés en mémoire (un par utilisateur)
+    GMAIL_SERVICE_CACHE_SIZE = 64
+    
+    # Gmail API : nombre maximal de requêtes par appel batch
+    GMAIL_BATCH_SIZE = 100
+    
+    # En-têtes récupérés (format=metadata) pour classer les emails avant le téléchargement complet
+    GMAIL_METADATA_HEADERS = ['Subject', 'From', 'List-Id']
+    
+    # Récupération concurrente des messages (surchargeable par groupe via 'max_fetch_concurrency')
+    MAX_FETCH_CONCURRENCY = int(os.getenv('MAX_FETCH_CONCURRENCY', 4))
+    FETCH_MAX_RETRIES = 5
+    
+    # Quota Gmail par utilisateur : 250 unités/seconde (coût en unités de chaque méthode)
+    GMAIL_QUOTA_UNITS_PER_SECOND = 250
+    GMAIL_QUOTA_UNITS = {'messages.get': 5, 'messages.list': 5, 'history.list': 2}
+    
+    # Classifieur local des emails promotionnels (NumPy) : désactivable, seuil de probabilité
+    # et jeu d'entraînement optionnel (par défaut promo_seed_data.json)
+    PROMO_CLASSIFIER_ENABLED = os.getenv('AUTOBRIEF_PROMO_CLASSIFIER', '1') != '0'
+    PROMO_CLASSIFIER_THRESHOLD = 0.5
+    PROMO_TRAINING_DATA = os.getenv('AUTOBRIEF_PROMO_TRAINING_DATA')
+    
+    # Synchronisation incrémentale : nombre d'IDs de messages traités conservés par groupe
+    SYNC_MAX_PROCESSED_IDS = 1000
+    
+    # Scheduler : nombre de groupes (utilisateur, groupe) traités simultanément
+    SCHEDULER_MAX_WORKERS = int(os.getenv('SCHEDULER_MAX_WORKERS', 4))
+    
+    # Scheduler : tokens OAuth2 rafraîchis en amont s'ils expirent dans moins de ce délai (secondes)
+    CREDENTIAL_REFRESH_MARGIN = 15 * 60
+    
+    # Scheduler : délai minimal (secondes) entre deux envois des mises à jour au Gist
+    SCHEDULER_FLUSH_INTERVAL = 120
+    
+    # Session HTTP partagée (GitHub, résolution des liens) : délais (connexion, lecture)
+    # en secondes, nouvelles tentatives des GET et taille des pools de connexions
+    HTTP_TIMEOUT = (5, 30)
+    HTTP_MAX_RETRIES = 3
+    HTTP_POOL_CONNECTIONS = 10
+    HTTP_POOL_MAXSIZE = 16
+    
     # Headers pour éviter les blocages
     HEADERS = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
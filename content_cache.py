@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ContentCache:
+    """Cache disque (SQLite) de textes compressés, avec éviction LRU selon la taille totale
+
+    ttl (secondes, optionnel) : durée de validité d'une entrée après son écriture.
+    """
+
+    def __init__(self, path, max_bytes, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        """Ouvre une connexion SQLite (une par opération, utilisable depuis plusieurs threads)"""
+        with self._init_lock:
+            if not self._initialized:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        value BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_access REAL NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                connection.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+                connection.commit()
+                self._initialized = True
+        return connection
+
+    def get(self, key):
+        """Retourne le texte en cache pour cette clé, ou None"""
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                if self.ttl is not None and now - row[1] > self.ttl:
+                    connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    connection.commit()
+                    return None
+                connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+                connection.commit()
+                return zlib.decompress(row[0]).decode('utf-8')
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"⚠️ DEBUG: Lecture cache impossible ({self.path}): {e}")
+            return None
+
+    def set(self, key, value):
+        """Stocke un texte compressé puis évince les entrées les moins récemment utilisées"""
+        try:
+            compressed = zlib.compress(value.encode('utf-8'))
+            connection = self._connect()
+            try:
+                now = time.time()
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, last_access, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, compressed, len(compressed), now, now)
+                )
+                self._evict(connection)
+                connection.commit()
+            finally:
+                connection.close()
+            return True
+        except Exception as e:
+            print(f"⚠️ DEBUG: Écriture cache impossible ({self.path}): {e}")
+            return False
+
+    def _evict(self, connection):
+        """Supprime les entrées expirées, puis les plus anciennes tant que la taille totale dépasse max_bytes"""
+        if self.ttl is not None:
+            connection.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        to_delete = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            to_delete.append((key,))
+            total_size -= size
+            if total_size <= self.max_bytes:
+                break
+        connection.executemany("DELETE FROM entries WHERE key = ?", to_delete)
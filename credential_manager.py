@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from http_client import get_session
+
+
+def credentials_from_info(credentials_info, default_scopes=None):
+    """Credentials google-auth à partir des credentials stockés (expiry : ISO, UTC naïf)"""
+    expiry = credentials_info.get('expiry')
+    return Credentials(
+        token=credentials_info.get('token'),
+        refresh_token=credentials_info.get('refresh_token'),
+        token_uri=credentials_info.get('token_uri', 'https://oauth2.googleapis.com/token'),
+        client_id=credentials_info.get('client_id'),
+        client_secret=credentials_info.get('client_secret'),
+        scopes=credentials_info.get('scopes', default_scopes),
+        expiry=datetime.fromisoformat(expiry) if expiry else None
+    )
+
+
+class CredentialManager:
+    """Rafraîchit en amont, en parallèle, les tokens OAuth2 des utilisateurs à traiter
+
+    Un token sans date d'expiration connue ou expirant dans moins de `margin` secondes
+    est rafraîchi avant le traitement : le rafraîchissement ne se fait plus au milieu
+    du traitement d'un groupe, et un utilisateur dont le token ne peut pas être
+    rafraîchi est écarté avant tout appel Gmail.
+    """
+
+    def __init__(self, max_workers, margin):
+        self.max_workers = max_workers
+        self.margin = timedelta(seconds=margin)
+        self.credentials = {}  # email -> credentials utilisables (token valide, expiry)
+        self.refreshed = set()  # Emails dont le token a été renouvelé (à sauvegarder)
+        self.failed = {}  # email -> raison de l'échec
+
+    def needs_refresh(self, credentials_info):
+        """Vrai si le token est absent, d'expiration inconnue ou bientôt expiré"""
+        expiry = credentials_info.get('expiry')
+        if not credentials_info.get('token') or not expiry:
+            return True
+        return datetime.fromisoformat(expiry) - self.margin <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def refresh(self, credentials_info):
+        """Renouvelle le token et retourne les credentials mises à jour"""
+        credentials = credentials_from_info(credentials_info)
+        credentials.refresh(Request(session=get_session()))
+        return dict(
+            credentials_info,
+            token=credentials.token,
+            expiry=credentials.expiry.isoformat() if credentials.expiry else None
+        )
+
+    def prepare(self, users_credentials):
+        """Prépare les credentials ({email: credentials stockées ou None}) et retourne celles utilisables"""
+        to_refresh = {}
+        for user_email, credentials_info in users_credentials.items():
+            if not credentials_info:
+                self.failed[user_email] = "aucun token OAuth2 stocké"
+            elif not self.needs_refresh(credentials_info):
+                self.credentials[user_email] = credentials_info
+            elif credentials_info.get('refresh_token'):
+                to_refresh[user_email] = credentials_info
+            else:
+                self.failed[user_email] = "token expiré sans refresh token"
+
+        if not to_refresh:
+            return self.credentials
+
+        max_workers = max(1, min(self.max_workers, len(to_refresh)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='autobrief-auth') as executor:
+            futures = {
+                user_email: executor.submit(self.refresh, credentials_info)
+                for user_email, credentials_info in to_refresh.items()
+            }
+
+        for user_email, future in futures.items():
+            try:
+                self.credentials[user_email] = future.result()
+                self.refreshed.add(user_email)
+            except Exception as e:
+                self.failed[user_email] = str(e)
+        return self.credentials
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Nettoyage du contenu des emails avant résumé (moins de tokens envoyés à OpenAI)
+
+Expressions régulières compilées une seule fois ; conversion HTML -> texte par
+selectolax si installé, sinon lxml (requirements.txt), sinon BeautifulSoup (plus lent
+que l'ancien nettoyage), sinon regex. Les signatures et pieds de page sont retirés
+ligne par ligne.
+
+Exécuté directement : micro-benchmark (débit et taille du texte produit) de chaque
+méthode de conversion et de l'ancien nettoyage, sur un dossier de fichiers HTML
+(argument) ou sur des newsletters générées.
+"""
+
+import html
+import os
+import re
+import sys
+import time
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:  # selectolax absent : lxml ou BeautifulSoup
+    SelectolaxParser = None
+
+try:
+    import lxml.html as lxml_html
+except ImportError:  # lxml absent (installé par requirements.txt) : BeautifulSoup
+    lxml_html = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:  # BeautifulSoup absent : regex
+    BeautifulSoup = None
+
+# Présence de balises HTML (sinon le texte est utilisé tel quel)
+HTML_TAG_PATTERN = re.compile(r'<(?:html|body|div|p|table|td|br|span|a|img)\b', re.IGNORECASE)
+
+# Éléments sans texte utile
+IGNORED_TAGS = ('script', 'style', 'head', 'meta', 'noscript', 'title')
+IGNORED_BLOCK_PATTERN = re.compile(r'<!--.*?-->|<(script|style|head|noscript|title)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+# Balises de bloc : un saut de ligne est inséré avant, pour garder un texte découpé en lignes
+BLOCK_TAG_PATTERN = re.compile(r'<(?:br|p|div|tr|li|h[1-6]|table|section|article|blockquote|hr)\b', re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+# En-têtes d'email en début de contenu
+EMAIL_HEADER_PREFIXES = ('From:', 'To:', 'Subject:', 'Date:', 'Message-ID:', 'X-', 'Return-Path:', 'Received:')
+
+# Lignes de signature ou de pied de page (ancrées en début de ligne, expressions
+# complètes : « Copyright law… » ou « Confidentialité : … » sont des lignes d'article)
+SIGNATURE_LINE_PATTERN = re.compile(
+    r'^\W*(?:'
+    r'sent from my|envoy[ée] depuis mon|get outlook for|disponible sur|powered by|'
+    r'unsubscribe|se d[ée]sabonner|d[ée]sabonnement|d[ée]sinscri(?:re|ption|vez-vous)|'
+    r'vous recevez cet e-?mail|you (?:are )?receiv(?:ed|ing) this e-?mail|this e-?mail was sent|'
+    r'privacy policy|politique de confidentialit[ée]|'
+    r'view (?:this e-?mail )?in (?:your|a) browser|voir (?:cet e-?mail |la version )?(?:en ligne|dans (?:votre|le) navigateur)|'
+    r'update your preferences|g[ée]rer (?:vos|mes) pr[ée]f[ée]rences|'
+    r'copyright\s*(?:©|\(c\))?\s*\d{4}|(?:©|\(c\))\s*\d{4}|tous droits r[ée]serv[ée]s|all rights reserved'
+    r')\b',
+    re.IGNORECASE
+)
+
+# Un marqueur de pied de page dans le dernier quart du texte : tout ce qui suit est retiré
+FOOTER_TAIL_RATIO = 0.25
+
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*\n+')
+SPACES_PATTERN = re.compile(r'[ \t\u00a0]+')
+URL_PATTERN = re.compile(r'https?://[^\s]+')
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\u200b-\u200d\u2060\ufeff\u034f]')
+
+
+def _selectolax_text(content):
+    tree = SelectolaxParser(content)
+    tree.strip_tags(list(IGNORED_TAGS))
+    root = tree.root
+    return root.text(separator='') if root is not None else ''
+
+
+def _lxml_text(content):
+    document = lxml_html.fromstring(content)
+    for element in document.xpath('//script|//style|//head|//noscript|//title'):
+        element.drop_tree()
+    return document.text_content()
+
+
+def _bs4_text(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    for element in soup(list(IGNORED_TAGS)):
+        element.decompose()
+    return soup.get_text()
+
+
+def _regex_text(content):
+    return html.unescape(TAG_PATTERN.sub('', IGNORED_BLOCK_PATTERN.sub('', content)))
+
+
+# Méthodes de conversion HTML -> texte, de la plus rapide à la plus lente
+HTML_BACKENDS = {
+    'selectolax': _selectolax_text if SelectolaxParser else None,
+    'lxml': _lxml_text if lxml_html else None,
+    'bs4': _bs4_text if BeautifulSoup else None,
+    'regex': _regex_text,
+}
+
+
+def available_backends():
+    """Noms des méthodes de conversion HTML -> texte disponibles, de la plus rapide à la plus lente"""
+    return [name for name, converter in HTML_BACKENDS.items() if converter]
+
+
+def html_to_text(content, backend=None):
+    """Texte d'un contenu HTML (première méthode disponible qui réussit, ou `backend`)"""
+    if not HTML_TAG_PATTERN.search(content):
+        return content
+
+    content = BLOCK_TAG_PATTERN.sub(lambda match: '\n' + match.group(0), content)
+    for name in ([backend] if backend else available_backends()):
+        try:
+            return HTML_BACKENDS[name](content)
+        except Exception as e:
+            print(f"⚠️ DEBUG: Conversion HTML ({name}) impossible: {e}")
+    return _regex_text(content)
+
+
+def strip_email_headers(content):
+    """Retire les en-têtes d'email (From:, To:, ...) présents en début de contenu"""
+    lines = content.split('\n')
+    for index, line in enumerate(lines):
+        if line.strip() == '' or not line.startswith(EMAIL_HEADER_PREFIXES):
+            return '\n'.join(lines[index:])
+    return ''
+
+
+def strip_signatures(content):
+    """Retire les lignes de signature / pied de page, et tout ce qui suit si elles sont en fin de texte"""
+    lines = content.split('\n')
+    tail_start = int(len(lines) * (1 - FOOTER_TAIL_RATIO))
+    kept = []
+    for index, line in enumerate(lines):
+        if SIGNATURE_LINE_PATTERN.match(line):
+            if index >= tail_start:
+                break
+            continue
+        kept.append(line)
+    return '\n'.join(kept)
+
+
+def clean_email_content(content, backend=None):
+    """Nettoie le contenu email pour minimiser les tokens"""
+    if not content:
+        return ""
+
+    # 1. Texte seul (HTML converti)
+    content = html_to_text(content, backend)
+
+    # 2. En-têtes d'email, 3. signatures et pieds de page
+    content = strip_signatures(strip_email_headers(content))
+
+    # 4. Espaces et lignes vides
+    content = SPACES_PATTERN.sub(' ', content)
+    content = BLANK_LINES_PATTERN.sub('\n\n', content)
+    content = content.strip()
+
+    # 5. URLs longues, 6. caractères de contrôle et invisibles
+    content = URL_PATTERN.sub('[LIEN]', content)
+    return CONTROL_CHARS_PATTERN.sub('', content)
+
+
+def _legacy_clean_email_content(content):
+    """Ancien nettoyage (référence du benchmark uniquement)"""
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style", "meta", "head"]):
+        script.decompose()
+    content = soup.get_text()
+
+    lines = content.split('\n')
+    cleaned_lines = []
+    in_body = False
+    for line in lines:
+        if not in_body and (line.strip() == '' or not line.startswith(EMAIL_HEADER_PREFIXES)):
+            in_body = True
+        if in_body:
+            cleaned_lines.append(line)
+    content = '\n'.join(cleaned_lines)
+
+    for pattern in [r'(?i)sent from my .*', r'(?i)envoyé depuis mon .*', r'(?i)get outlook for .*',
+                    r'(?i)disponible sur .*', r'(?i)powered by .*', r'(?i)confidentialité.*', r'(?i)privacy.*',
+                    r'(?i)unsubscribe.*', r'(?i)désabonnement.*', r'(?i)vous recevez cet email.*',
+                    r'(?i)this email was sent.*']:
+        content = re.sub(pattern, '', content, flags=re.MULTILINE | re.DOTALL)
+
+    content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+    content = re.sub(r'[ \t]+', ' ', content)
+    content = content.strip()
+    content = re.sub(r'https?://[^\s]+', '[LIEN]', content)
+    return re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', content)
+
+
+def _sample_newsletter(index):
+    """Newsletter HTML générée (tableaux de mise en page, liens de tracking, pied de page)"""
+    articles = ''.join(
+        f'<tr><td style="padding:12px"><h2 style="font-size:18px">Article {index}.{n} : '
+        f'les enjeux de la privacy by design pour les produits IA</h2>'
+        f'<p style="color:#333">Un résumé de plusieurs phrases sur le sujet {n}, avec des détails '
+        f'chiffrés (+{n * 7} %) et une citation. <a href="https://click.example.com/redirect?u={index}-{n}'
+        f'&amp;utm_source=newsletter">Lire la suite</a></p></td></tr>'
+        for n in range(12)
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Newsletter</title>'
+        '<style>td{font-family:Arial} .btn{color:#fff}</style></head><body>'
+        '<div style="display:none">Aperçu du contenu&zwnj;&nbsp;&zwnj;&nbsp;</div>'
+        '<table width="600"><tr><td><a href="https://example.com/view">Voir cet email dans votre navigateur</a></td></tr>'
+        f'{articles}'
+        '<tr><td><p>Vous recevez cet email car vous êtes inscrit à notre newsletter.</p>'
+        '<p><a href="https://example.com/unsubscribe">Se désabonner</a> | '
+        '<a href="https://example.com/privacy">Politique de confidentialité</a></p>'
+        '<p>© 2026 Exemple Media, 1 rue de Paris, 75001 Paris</p></td></tr></table>'
+        '<script>track()</script></body></html>'
+    )
+
+
+def _load_corpus(directory):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.html', '.htm', '.txt', '.eml')):
+            with open(os.path.join(directory, name), 'r', encoding='utf-8', errors='replace') as f:
+                corpus.append(f.read())
+    return corpus
+
+
+def main():
+    """Micro-benchmark : débit et taille du texte produit par méthode de conversion"""
+    if len(sys.argv) > 1:
+        corpus = _load_corpus(sys.argv[1])
+        source = sys.argv[1]
+    else:
+        corpus = [_sample_newsletter(index) for index in range(50)]
+        source = "newsletters générées"
+    if not corpus:
+        print("❌ Aucun fichier .html/.htm/.txt/.eml trouvé")
+        sys.exit(1)
+
+    total_bytes = sum(len(content.encode('utf-8')) for content in corpus)
+    print(f"📚 {len(corpus)} emails ({total_bytes / 1024:.0f} Ko) - {source}")
+    print("   Méthode           ms/email    Mo/s   caractères produits")
+
+    candidates = [(f"nouveau ({name})", lambda content, name=name: clean_email_content(content, name))
+                  for name in available_backends()]
+    if BeautifulSoup:
+        candidates.append(("ancien (bs4)", _legacy_clean_email_content))
+
+    for label, cleaner in candidates:
+        elapsed = float('inf')
+        for _ in range(3):  # Meilleur de 3 passages
+            started = time.perf_counter()
+            outputs = [cleaner(content) for content in corpus]
+            elapsed = min(elapsed, time.perf_counter() - started)
+        print(f"   {label:<18} {elapsed * 1000 / len(corpus):8.2f} {total_bytes / 1e6 / elapsed:7.1f} "
+              f"  {sum(len(output) for output in outputs):>10}")
+
+
+if __name__ == "__main__":
+    main()
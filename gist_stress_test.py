@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Test de charge des écritures concurrentes sur le Gist (serveur d'API Gist local simulé)
+
+Des écrivains (threads) ajoutent chacun des entrées uniques aux mêmes utilisateurs,
+et certains créent de nouveaux utilisateurs, via GistUserDataStore.update_users.
+Le faux serveur reproduit ce dont dépend l'écriture optimiste : ETag / 304,
+révisions (GET /gists/:id/:version), historique dans les réponses, suppression de
+fichier (null) et PATCH non conditionnel, retardé pour provoquer des écritures
+intercalées. Le test échoue si une écriture confirmée à son auteur a été perdue ;
+les écritures abandonnées (exception levée à l'appelant) sont comptées à part.
+
+L'ancien user_data.json est migré avant le démarrage des écrivains : le test porte
+sur update_users, pas sur des migrations concurrentes.
+
+Usage : python gist_stress_test.py [écrivains] [écritures par écrivain]
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import user_data_store
+from user_data_store import GistUserDataStore
+
+GIST_ID = 'stress'
+
+# Utilisateurs présents dans l'ancien user_data.json (migré au premier accès)
+EXISTING_USERS = ('alice@example.com', 'bob@example.com', 'carol@example.com')
+
+# Délai maximal (secondes) entre la réception d'un PATCH et son application
+PATCH_DELAY = 0.01
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Tous les écrivains peuvent se connecter en même temps
+
+
+class FakeGistServer:
+    """Serveur d'API Gist en mémoire (un seul Gist) sur un port local libre"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.revisions = [(uuid.uuid4().hex, dict(self.files))]  # Plus ancienne en premier
+        self.lock = threading.Lock()
+        self.stats = {'get': 0, 'not_modified': 0, 'patch': 0, 'revision': 0}
+        self.server = _Server(('127.0.0.1', 0), self._handler())
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _document(self, files, revision_index):
+        history = [{'version': version} for version, _ in reversed(self.revisions[:revision_index + 1])]
+        return {
+            'id': GIST_ID,
+            'files': {name: {'filename': name, 'content': content} for name, content in files.items()},
+            'history': history
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=None, headers=None):
+                data = json.dumps(body).encode('utf-8') if body is not None else b''
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')  # gists/<id>[/<version>]
+                with fake.lock:
+                    if len(parts) == 3:
+                        fake.stats['revision'] += 1
+                        for index, (version, files) in enumerate(fake.revisions):
+                            if version == parts[2]:
+                                return self._send(200, fake._document(files, index))
+                        return self._send(404, {'message': 'Not Found'})
+
+                    fake.stats['get'] += 1
+                    etag = f'"{fake.revisions[-1][0]}"'
+                    if self.headers.get('If-None-Match') == etag:
+                        fake.stats['not_modified'] += 1
+                        return self._send(304, headers={'ETag': etag})
+                    return self._send(200, fake._document(fake.files, len(fake.revisions) - 1), {'ETag': etag})
+
+            def do_PATCH(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(random.uniform(0, PATCH_DELAY))
+                with fake.lock:
+                    fake.stats['patch'] += 1
+                    # Comme l'API : suppression d'un fichier absent refusée, sans rien appliquer
+                    if any(file_info is None and name not in fake.files for name, file_info in payload['files'].items()):
+                        return self._send(422, {'message': 'Validation Failed'})
+                    for name, file_info in payload['files'].items():
+                        if file_info is None:
+                            del fake.files[name]
+                        else:
+                            fake.files[name] = file_info['content']
+                    fake.revisions.append((uuid.uuid4().hex, dict(fake.files)))
+                    return self._send(200, fake._document(fake.files, len(fake.revisions) - 1))
+
+        return Handler
+
+
+def run(writers, writes_per_writer):
+    """Lance les écrivains et retourne (écritures confirmées, abandonnées, perdues, durée)"""
+    legacy = {user_email: {'entries': {}} for user_email in EXISTING_USERS}
+    server = FakeGistServer({user_data_store.LEGACY_FILENAME: json.dumps(legacy)}).start()
+    user_data_store.GITHUB_API_URL = server.url
+    user_data_store._gist_cache.clear()
+    GistUserDataStore(GIST_ID, 'token').load_users()  # Migration
+
+    confirmed = {}  # email -> clés dont l'écriture a été confirmée
+    confirmed_lock = threading.Lock()
+    abandoned = []
+
+    def writer(writer_index):
+        store = GistUserDataStore(GIST_ID, 'token')
+        for write_index in range(writes_per_writer):
+            # Un écrivain sur trois écrit dans un utilisateur qu'il crée (index.json modifié)
+            if writer_index % 3 == 0:
+                user_email = f'new{writer_index % 4}@example.com'
+            else:
+                user_email = EXISTING_USERS[(writer_index + write_index) % len(EXISTING_USERS)]
+            key = f'{writer_index}-{write_index}'
+
+            def add_entry(email, current, key=key):
+                data = current or {'entries': {}}
+                data['entries'][key] = time.time()
+                return data
+
+            try:
+                store.update_users([user_email], add_entry)
+            except Exception as e:
+                abandoned.append(f"{key}: {e}")
+                continue
+            with confirmed_lock:
+                confirmed.setdefault(user_email, set()).add(key)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    user_data_store._gist_cache.clear()
+    final_data = GistUserDataStore(GIST_ID, 'token').load_users()
+    lost = sorted(
+        f"{user_email} {key}"
+        for user_email, keys in confirmed.items()
+        for key in keys - set((final_data.get(user_email) or {}).get('entries', {}))
+    )
+    server.stop()
+    print(f"📊 Serveur: {server.stats['get']} GET ({server.stats['not_modified']} réponses 304), "
+          f"{server.stats['patch']} PATCH, {server.stats['revision']} révisions lues, "
+          f"user_data.json {'présent' if user_data_store.LEGACY_FILENAME in server.files else 'supprimé'}")
+    return sum(len(keys) for keys in confirmed.values()), abandoned, lost, elapsed
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    writes_per_writer = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    print(f"🚀 {writers} écrivains x {writes_per_writer} écritures sur {len(EXISTING_USERS)} utilisateurs existants")
+    confirmed, abandoned, lost, elapsed = run(writers, writes_per_writer)
+    print(f"⏱️ {confirmed} écritures confirmées, {len(abandoned)} abandonnées, en {elapsed:.1f}s")
+
+    if lost:
+        print(f"❌ {len(lost)} écritures confirmées perdues: {', '.join(lost[:10])}")
+        sys.exit(1)
+    print("✅ Aucune écriture confirmée perdue")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+from rate_limiter import RETRYABLE_STATUSES
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """Session requests avec un délai d'attente par défaut (requests n'en applique aucun)"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session():
+    """Nouvelle session : connexions persistantes (keep-alive) et nouvelles tentatives
+
+    Seules les requêtes idempotentes (GET, HEAD) sont retentées, sur erreur de connexion
+    ou statut 429/5xx (en respectant Retry-After) ; la réponse finale est retournée
+    telle quelle à l'appelant. Les écritures (PATCH) ne sont jamais rejouées ici.
+    """
+    retry = Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=sorted(RETRYABLE_STATUSES),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=Config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+        max_retries=retry
+    )
+    session = PooledSession(Config.HTTP_TIMEOUT)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Session HTTP partagée par tout le processus (threads compris)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
@@ -0,0 +1,107 @@
+import re
+import unicodedata
+
+# Mots-clés des emails promotionnels (recherchés dans le sujet)
+PROMOTIONAL_KEYWORDS = (
+    # Mots-clés de réduction/offre
+    'offre', 'réduction', 'promo', 'code', 'rabais', 'discount', 'remise',
+    'moitié prix', 'prix cassé', 'prix barré', 'économie', 'économisez',
+    'profitez', 'spécial', 'limité', 'urgent', 'flash', 'éclair',
+
+    # Mots-clés d'achat/vente
+    'vente', 'achat', 'commander', 'boutique', 'shop', 'store', 'magasin',
+    'commande', 'panier', 'ajouter au panier', 'livraison', 'expédition',
+    'paiement', 'carte bancaire', 'cb', 'paypal', 'stripe',
+
+    # Mots-clés promotionnels
+    'gratuit', 'free', 'deal', 'bargain', 'sale', 'clearance', 'liquidation',
+    'soldes', 'promotion', 'cadeau', 'gift', 'bonus', 'prime',
+    'exclusif', 'exclusive', 'réservé', 'private', 'vip',
+
+    # Mots-clés d'urgence/pression
+    'dépêchez-vous', 'hâtez-vous', 'fin', 'dernière', 'dernières heures',
+    'bientôt fini', 'stock limité', 'quantité limitée', 'plus que',
+    'ne manquez pas', 'occasion unique', 'une seule fois',
+
+    # Mots-clés d'abonnement
+    'abonnement', 'subscription', 's\'abonner', 'subscribe', 'newsletter',
+    'inscription', 'inscrivez-vous', 'rejoignez', 'join', 'adhésion',
+
+    # Mots-clés commerciaux
+    'client', 'customer', 'satisfaction', 'garantie', 'warranty',
+    'service client', 'support', 'aide', 'help', 'contact',
+    'devis', 'quote', 'estimation', 'tarif', 'prix',
+)
+
+# Apostrophes typographiques ramenées à l'apostrophe simple
+_APOSTROPHES = str.maketrans({'’': "'", '‘': "'", 'ʼ': "'"})
+
+# Diacritiques combinants (après décomposition NFD)
+_COMBINING_MARKS = re.compile('[\u0300-\u036f]')
+
+
+def fold_text(text):
+    """Minuscules sans accents ni apostrophes typographiques ("Économisez’" -> "economisez'")"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFD', text.translate(_APOSTROPHES).casefold())
+    return _COMBINING_MARKS.sub('', decomposed)
+
+
+def _trie_pattern(keywords):
+    """Alternative regex factorisée par préfixes communs (moins de retours arrière qu'une liste à plat)"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Mot-clé complet à ce nœud : la suite est facultative ("prix" puis "prix casse")
+        return '(?:' + pattern + ')?' if '' in node else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Recherche de mots-clés en un seul passage (une expression régulière compilée)
+
+    Les mots-clés sont reconnus comme mots entiers ("code" ne correspond pas à
+    "encode"), au singulier ou au pluriel en -s/-x, sans tenir compte de la casse,
+    des accents ni des espaces multiples.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = {}  # Mot-clé normalisé -> mot-clé d'origine
+        for keyword in keywords:
+            self.keywords.setdefault(self._normalize(keyword), keyword)
+
+        # Les quantificateurs gloutons du trie privilégient le plus long mot-clé ("prix cassé" avant "prix")
+        self.pattern = re.compile(r'(?<!\w)(' + _trie_pattern(self.keywords) + r')[sx]?(?!\w)')
+
+    @staticmethod
+    def _normalize(text):
+        return ' '.join(fold_text(text).split())
+
+    def find_all(self, text):
+        """Mots-clés (forme d'origine) présents dans text, sans doublon, dans l'ordre d'apparition"""
+        found = {}
+        for match in self.pattern.finditer(fold_text(text)):
+            keyword = self.keywords[self._normalize(match.group(1))]
+            found.setdefault(keyword, None)
+        return list(found)
+
+    def matches(self, text):
+        """Vrai si au moins un mot-clé est présent (arrêt à la première occurrence)"""
+        return self.pattern.search(fold_text(text)) is not None
+
+
+PROMOTIONAL_MATCHER = KeywordMatcher(PROMOTIONAL_KEYWORDS)
@@ -4,23 +4,119 @@ import json
 from datetime import datetime, timedelta
 from config import Config
 from secure_auth import SecureAuth
+from content_cache import ContentCache
+from user_data_store import create_user_data_store
+from save_buffer import SaveBuffer
+from http_client import get_session
+from keyword_matcher import PROMOTIONAL_MATCHER
+from promo_classifier import get_default_classifier, message_fields
+from email_cleaner import clean_email_content
 import base64
+import html
 import requests
 import re
 from openai import OpenAI
 import time
 import pickle
+import hashlib
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from googleapiclient.errors import HttpError
+from rate_limiter import TokenBucket, is_retryable_error, backoff_delay
+from token_budget import TokenBudget
 
 class NewsletterManager:
-    def __init__(self):
+    # À incrémenter à chaque modification de clean_email_content (invalide le cache des contenus)
+    CLEANER_VERSION = 3
+    
+    # À incrémenter à chaque modification du prompt d'extraction (invalide les actualités mémorisées)
+    SUMMARY_PROMPT_VERSION = 1
+    
+    # Séparateur historique entre emails concaténés
+    EMAIL_SEPARATOR = "\n\n--- NOUVEL EMAIL ---\n\n"
+    
+    # Template HTML de l'email de résumé
+    SUMMARY_HTML_TEMPLATE = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>
+                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
+                .header { padding: 20px; text-align: center; margin-bottom: 20px; }
+                .header img { max-width: 80px; vertical-align: middle; margin-right: 10px; }
+                .header .brand { display: inline-block; vertical-align: middle; font-weight: bold; color: #667eea; font-size: 24px; }
+                .header .subtitle { color: #666; font-size: 18px; margin-top: 5px; }
+                .section { background: #f8f9fa; margin: 15px 0; padding: 15px; border-radius: 6px; border-left: 4px solid #667eea; }
+                .section-title { color: #2c3e50; font-size: 18px; font-weight: bold; margin-bottom: 10px; }
+                .section-content { color: #555; }
+                .footer { padding: 15px; text-align: center; margin-top: 20px; }
+                .footer .subtitle { color: #666; font-size: 14px; margin-top: 5px; }
+                a { color: #667eea; text-decoration: none; }
+                a:hover { text-decoration: underline; }
+            </style>
+        </head>
+        <body>
+            <div class="header">
+                <img src="https://raw.githubusercontent.com/AlexisMetton/AutoBrief/main/public/assets/logo_autobrief.png" alt="AutoBrief">
+                <span class="brand">AutoBrief</span>
+                <div class="subtitle">Actualités du {date}</div>
+            </div>
+            
+            {sections}
+            
+            <div class="footer">
+                <div class="subtitle">Généré automatiquement par AutoBrief</div>
+            </div>
+        </body>
+        </html>
+        """
+    
+    def __init__(self, user_email=None, user_data=None):
+        """user_email : utilisateur explicite (scheduler). L'instance est alors isolée de
+        st.session_state et travaille sur user_data (données de l'utilisateur) si fourni."""
         self.config = Config()
         self.auth = SecureAuth()
         self.client = OpenAI(api_key=self.config.get_openai_key())
-        self.user_email = st.session_state.get('user_email', 'default_user') if hasattr(st, 'session_state') else 'default_user'
-        self._scheduler_mode = False  # Mode scheduler désactivé par défaut
+        self._isolated = user_email is not None
+        self._user_data = user_data
+        if self._isolated:
+            self.user_email = user_email
+        else:
+            self.user_email = st.session_state.get('user_email', 'default_user') if hasattr(st, 'session_state') else 'default_user'
+        self._scheduler_mode = self._isolated  # Pas de sauvegarde dans le Gist en mode isolé
+        self.pending_sync_states = {}  # État de synchronisation Gmail à persister, par groupe
+        self.rate_limiter = TokenBucket(self.config.GMAIL_QUOTA_UNITS_PER_SECOND)
+        self.fetch_concurrency = self.config.MAX_FETCH_CONCURRENCY
+        self._stats_lock = threading.Lock()
+        self._reset_fetch_stats()
+        self.token_usage = {}
+        self.body_cache = ContentCache(
+            os.path.join(self.config.CACHE_DIR, 'message_bodies.sqlite3'),
+            self.config.BODY_CACHE_MAX_BYTES
+        )
+        # Actualités par email, partagées entre groupes et utilisateurs (scheduler compris)
+        self.email_items_cache = ContentCache(
+            os.path.join(self.config.CACHE_DIR, 'email_items.sqlite3'),
+            self.config.EMAIL_ITEMS_CACHE_MAX_BYTES,
+            ttl=self.config.EMAIL_ITEMS_CACHE_TTL
+        )
+        # URLs finales des liens de redirection
+        self.url_cache = ContentCache(
+            os.path.join(self.config.CACHE_DIR, 'resolved_urls.sqlite3'),
+            self.config.URL_CACHE_MAX_BYTES,
+            ttl=self.config.URL_CACHE_TTL
+        )
+        self.llm_cache = ContentCache(
+            os.path.join(self.config.CACHE_DIR, 'llm_responses.sqlite3'),
+            self.config.LLM_CACHE_MAX_BYTES,
+            ttl=self.config.LLM_CACHE_TTL
+        )
         
-        # Détecter automatiquement la reconnexion
-        self._detect_reconnection()
+        # Détecter automatiquement la reconnexion (session Streamlit uniquement)
+        if not self._isolated:
+            self._detect_reconnection()
         
         # Désactiver la vérification du Gist au démarrage (trop intrusive)
         # self.check_gist_configuration()
@@ -58,6 +154,9 @@ class NewsletterManager:
             # Mettre à jour l'email utilisateur avant de charger
             self.user_email = st.session_state.get('user_email', 'default_user')
             
+            # Envoyer d'abord les sauvegardes différées pour ne pas relire des données périmées
+            self.flush_pending_saves()
+            
             # Forcer le rechargement depuis le Gist
             data = self.load_from_github_gist()
             if data:
@@ -128,9 +227,8 @@ class NewsletterManager:
             if gist_token:
                 # Vérifier que le Gist est privé (sécurité)
                 try:
-                    import requests
                     headers = {'Authorization': f'token {gist_token}'}
-                    response = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers)
+                    response = get_session().get(f'https://api.github.com/gists/{gist_id}', headers=headers)
                     
                     if response.status_code == 200:
                         gist_data = response.json()
@@ -184,6 +282,12 @@ class NewsletterManager:
     def load_user_data(self):
         """Charge les données utilisateur depuis le Gist uniquement"""
         try:
+            # Instance isolée (scheduler) : pas de cache partagé en session
+            if self._isolated:
+                if self._user_data is None:
+                    self._user_data = self.load_from_github_gist() or {'newsletter_groups': []}
+                return self._user_data
+            
             # Mettre à jour l'email utilisateur avant de charger
             if hasattr(st, 'session_state') and 'user_email' in st.session_state:
                 self.user_email = st.session_state['user_email']
@@ -217,49 +321,31 @@ class NewsletterManager:
             }
     
     
+    def get_user_data_store(self):
+        """Stockage des données utilisateur (Gist partagé ou base SQLite locale selon la configuration)"""
+        gist_id = None
+        
+        # Fallback sur la session state pour l'ID du Gist
+        if not self.config.get_gist_id() and not self._isolated:
+            gist_id = st.session_state.get('gist_id') if hasattr(st, 'session_state') else None
+        
+        return create_user_data_store(self.config, gist_id)
+    
     def load_from_github_gist(self):
         """Charge depuis GitHub Gist partagé"""
         try:
-            # Utiliser le Gist partagé depuis les secrets Streamlit
-            gist_id = None
-            
-            # Essayer d'abord depuis les secrets Streamlit
-            try:
-                if hasattr(st, 'secrets') and 'GIST_ID' in st.secrets:
-                    gist_id = st.secrets['GIST_ID']
-            except:
-                pass
-            
-            # Fallback sur les variables d'environnement (pour GitHub Actions)
-            if not gist_id:
-                gist_id = os.getenv('GIST_ID')
-            
-            # Fallback sur la session state
-            if not gist_id:
-                gist_id = st.session_state.get('gist_id') if hasattr(st, 'session_state') else None
-            
-            if not gist_id:
+            store = self.get_user_data_store()
+            if not store:
                 return None
             
-            import requests
-            response = requests.get(f'https://api.github.com/gists/{gist_id}')
-            
-            if response.status_code == 200:
-                gist_data = response.json()
-                if 'user_data.json' in gist_data['files']:
-                    content = gist_data['files']['user_data.json']['content']
-                    all_users_data = json.loads(content) if content else {}
-                    
-                    # Retourner les données de cet utilisateur spécifique
-                    if self.user_email in all_users_data:
-                        user_data = all_users_data[self.user_email]
-                        return user_data
-                    else:
-                        # Utilisateur pas encore dans le Gist - retourner des données par défaut
-                        return {
-                            'newsletter_groups': []
-                        }
-            return None
+            # Retourner les données de cet utilisateur spécifique
+            user_data = store.load_user(self.user_email)
+            if user_data is None:
+                # Utilisateur pas encore dans le Gist - retourner des données par défaut
+                return {
+                    'newsletter_groups': []
+                }
+            return user_data
         except Exception as e:
             return None
     
@@ -296,6 +382,12 @@ class NewsletterManager:
                     if hasattr(st, 'warning'):
                         st.warning(f"Impossible de sauvegarder les credentials OAuth2: {e}")
             
+            # Interface : sauvegarde différée, regroupée avec les modifications suivantes
+            save_buffer = self.get_save_buffer()
+            if save_buffer:
+                save_buffer.submit(cleaned_data)
+                return True
+            
             # Sauvegarder directement dans le Gist
             success = self.save_to_github_gist(cleaned_data)
             
@@ -322,120 +414,133 @@ class NewsletterManager:
         return cleaned_data
     
     
+    def get_writable_store(self):
+        """Stockage des données utilisateur accessible en écriture, None (avec un avertissement) sinon"""
+        store = self.get_user_data_store()
+        
+        if not store:
+            # En mode GitHub Actions, on ne peut pas afficher de warning Streamlit
+            if os.getenv('GITHUB_ACTIONS'):
+                print("❌ GIST_ID non configuré dans les variables d'environnement")
+            else:
+                st.warning("""
+                **Gist partagé non configuré**
+                
+                Pour utiliser la persistance automatique :
+                1. Le développeur doit créer un Gist manuellement
+                2. Ajouter le secret `GIST_ID` dans Streamlit Cloud
+                3. Tous les utilisateurs partageront le même Gist
+                """)
+            return None
+        
+        if not store.can_write:
+            st.error("Token GIST_TOKEN manquant dans les secrets Streamlit")
+            return None
+        
+        return store
+    
     def save_to_github_gist(self, data):
         """Sauvegarde dans GitHub Gist (gratuit et automatique)"""
         try:
-            import requests
-            
-            # Vérifier que le Gist est configuré dans les secrets
-            gist_id = None
-            
-            try:
-                if hasattr(st, 'secrets') and 'GIST_ID' in st.secrets:
-                    gist_id = st.secrets['GIST_ID']
-            except:
-                pass
-            
-            # Fallback sur les variables d'environnement (pour GitHub Actions)
-            if not gist_id:
-                gist_id = os.getenv('GIST_ID')
-            
-            if not gist_id:
-                # En mode GitHub Actions, on ne peut pas afficher de warning Streamlit
-                if os.getenv('GITHUB_ACTIONS'):
-                    print("❌ GIST_ID non configuré dans les variables d'environnement")
-                else:
-                    st.warning("""
-                    **Gist partagé non configuré**
-                    
-                    Pour utiliser la persistance automatique :
-                    1. Le développeur doit créer un Gist manuellement
-                    2. Ajouter le secret `GIST_ID` dans Streamlit Cloud
-                    3. Tous les utilisateurs partageront le même Gist
-                    """)
-                return False
-            
-            # Vérifier que le Gist existe et est accessible
-            response = requests.get(f'https://api.github.com/gists/{gist_id}')
-            
-            if response.status_code == 200:
-                gist_data = response.json()
-                if 'user_data.json' in gist_data['files']:
-                    # Charger les données existantes
-                    existing_content = gist_data['files']['user_data.json']['content']
-                    all_users_data = json.loads(existing_content) if existing_content else {}
-                else:
-                    all_users_data = {}
-            else:
+            store = self.get_writable_store()
+            if not store:
                 return False
             
-            # Ajouter/mettre à jour les données de cet utilisateur
-            all_users_data[self.user_email] = data
-            
-            # Mettre à jour le Gist avec toutes les données
-            update_data = {
-                    "files": {
-                        "user_data.json": {
-                            "content": json.dumps(all_users_data, indent=2, ensure_ascii=False)
-                        }
-                    }
-                }
-                
-            # Essayer de mettre à jour le Gist avec authentification GitHub
-            gist_token = None
-            
-            # Essayer d'abord depuis les secrets Streamlit
-            try:
-                if hasattr(st, 'secrets') and 'GIST_TOKEN' in st.secrets:
-                    gist_token = st.secrets['GIST_TOKEN']
-            except:
-                pass
-            
-            # Fallback sur les variables d'environnement (pour GitHub Actions)
-            if not gist_token:
-                gist_token = os.getenv('GIST_TOKEN')
-            
-            if gist_token:
-                # Utiliser le token GitHub pour l'authentification
-                headers = {
-                    'Accept': 'application/vnd.github.v3+json',
-                    'Authorization': f'token {gist_token}'
-                }
-            else:
-                st.error("Token GIST_TOKEN manquant dans les secrets Streamlit")
-                return False
-            
-            if gist_token:
-                update_response = requests.patch(
-                    f'https://api.github.com/gists/{gist_id}',
-                    json=update_data,
-                    headers=headers
-                )
-                
-                
-                if update_response.status_code == 200:
-                    return True
-                else:
-                    return False
-            else:
-                # Pas de token Gist - sauvegarde en session uniquement
-                st.warning("""
-                **Token Gist manquant**
-                    
-                    Pour la sauvegarde automatique :
-                    1. Créez un token GitHub avec le scope `gist`
-                    2. Ajoutez-le dans les secrets Streamlit : `GIST_TOKEN`
-                    3. La sauvegarde sera automatique
-                """)
-                
-                return False
+            return self._write_user_data(store, self.user_email, data)
             
         except Exception as e:
             st.error(f"Erreur GitHub Gist: {e}")
             return False
     
+    def _write_user_data(self, store, user_email, data):
+        """Écrit les données d'un utilisateur (sans st.*, utilisable depuis un thread)"""
+        # Seul le fichier de cet utilisateur est envoyé ; l'état écrit entre-temps
+        # par le scheduler (last_run, sync_state) est conservé
+        return store.update_users(
+            [user_email],
+            lambda _, current: self._merge_scheduler_state(data, current)
+        )
     
+    def get_save_buffer(self):
+        """Tampon de sauvegarde différée de cet utilisateur dans la session Streamlit
+        
+        None pour une instance isolée (scheduler) ou si le stockage n'est pas accessible
+        en écriture : la sauvegarde est alors directe.
+        """
+        if self._isolated or not hasattr(st, 'session_state'):
+            return None
+        
+        save_buffers = st.session_state.setdefault('save_buffers', {})
+        if self.user_email in save_buffers:
+            return save_buffers[self.user_email]
         
+        store = self.get_writable_store()
+        if not store:
+            return None
+        
+        user_email = self.user_email
+        save_buffer = SaveBuffer(
+            lambda data: self._write_user_data(store, user_email, data),
+            self.config.SAVE_DEBOUNCE_SECONDS
+        )
+        save_buffers[user_email] = save_buffer
+        return save_buffer
+    
+    def flush_pending_saves(self):
+        """Envoie immédiatement les sauvegardes différées de la session (déconnexion, rechargement)"""
+        if self._isolated or not hasattr(st, 'session_state'):
+            return True
+        
+        success = True
+        for save_buffer in st.session_state.get('save_buffers', {}).values():
+            if not save_buffer.flush():
+                success = False
+        return success
+    
+    def render_save_status(self, slot=None):
+        """Affiche l'état des sauvegardes différées (actualisé tant qu'un envoi est en cours)
+        
+        À appeler après les actions de la page, pour refléter une sauvegarde qui vient
+        d'être demandée ; slot (st.empty() réservé plus haut) place l'indicateur en haut.
+        """
+        save_buffer = st.session_state.get('save_buffers', {}).get(self.user_email)
+        if not save_buffer or save_buffer.status == SaveBuffer.IDLE:
+            return
+        
+        def show_status():
+            if save_buffer.busy:
+                st.caption("💾 Enregistrement…")
+            elif save_buffer.status == SaveBuffer.SAVED:
+                st.caption("✅ Enregistré")
+            else:
+                st.caption(f"⚠️ Enregistrement échoué, nouvelle tentative à la prochaine modification : {save_buffer.last_error}")
+        
+        # st.fragment (Streamlit >= 1.37) : seul l'indicateur est réexécuté
+        fragment = getattr(st, 'fragment', None)
+        with (slot.container() if slot is not None else st.container()):
+            if fragment and save_buffer.busy:
+                fragment(run_every=1)(show_status)()
+            else:
+                show_status()
+    
+    
+        
+    def _merge_scheduler_state(self, data, current):
+        """Reporte dans data l'exécution la plus récente de chaque groupe présente dans current"""
+        if not current:
+            return data
+        current_groups = {group.get('title'): group for group in current.get('newsletter_groups', [])}
+        for group in data.get('newsletter_groups', []):
+            current_group = current_groups.get(group.get('title'))
+            if not current_group:
+                continue
+            current_last_run = current_group.get('settings', {}).get('last_run') or ''
+            if current_last_run > (group.get('settings', {}).get('last_run') or ''):
+                group.setdefault('settings', {})['last_run'] = current_last_run
+                if current_group.get('sync_state'):
+                    group['sync_state'] = current_group['sync_state']
+        return data
+    
     def save_newsletters(self, newsletters):
         """Sauvegarde la liste des newsletters dans le Gist"""
         # Mettre à jour les données utilisateur complètes
@@ -607,6 +712,8 @@ class NewsletterManager:
     def render_newsletter_management(self):
         """Interface de gestion des newsletters"""
         st.markdown("### <i class='fas fa-home'></i> Gestion des newsletters", unsafe_allow_html=True)
+        # Emplacement de l'indicateur de sauvegarde, rempli après les actions de la page
+        save_status_slot = st.empty()
         
         # Ajouter un groupe de newsletters
         with st.expander('Ajouter un nouveau groupe de newsletters', expanded=True):
@@ -893,6 +1000,8 @@ class NewsletterManager:
                             st.caption(f"Dernière exécution : {last_run}")
         else:
             st.info("Aucun groupe de newsletters créé. Créez-en un ci-dessus.")
+        
+        self.render_save_status(save_status_slot)
     
     def get_query_for_emails(self, emails, days=7):
         """Génère la requête Gmail pour récupérer les emails"""
@@ -902,11 +1011,82 @@ class NewsletterManager:
         query += ')'
         return query
     
+    def iter_messages(self, service, query, page_size=100):
+        """Parcourt tous les IDs de messages Gmail correspondant à la requête, page par page
+        
+        Suit nextPageToken jusqu'à la dernière page ; les IDs sont produits dès
+        que chaque page arrive. Une erreur sur une page est propagée à l'appelant :
+        un listing interrompu ne doit pas passer pour un listing complet.
+        """
+        page_token = None
+        while True:
+            try:
+                self._record_fetch_stat('throttle_wait', self.rate_limiter.acquire(self.config.GMAIL_QUOTA_UNITS['messages.list']))
+                self._record_fetch_stat('http_requests', 1)
+                response = service.users().messages().list(
+                    userId='me', q=query, maxResults=page_size, pageToken=page_token
+                ).execute(num_retries=self.config.FETCH_MAX_RETRIES)
+            except Exception as e:
+                print(f"❌ DEBUG: Erreur lors de la récupération des emails (listing interrompu): {e}")
+                raise
+            
+            for msg in response.get('messages', []):
+                yield msg['id']
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def get_current_history_id(self, service):
+        """Récupère l'historyId courant de la boîte Gmail"""
+        try:
+            return service.users().getProfile(userId='me').execute().get('historyId')
+        except Exception as e:
+            print(f"❌ DEBUG: Impossible de récupérer l'historyId: {e}")
+            return None
+    
+    def list_history_message_ids(self, service, start_history_id):
+        """Liste les IDs des messages ajoutés depuis start_history_id (users.history.list)
+        
+        Retourne None si l'historique n'est plus disponible (historyId trop ancien),
+        auquel cas il faut revenir à une requête complète.
+        """
+        message_ids = []
+        seen = set()
+        page_token = None
+        try:
+            while True:
+                self._record_fetch_stat('throttle_wait', self.rate_limiter.acquire(self.config.GMAIL_QUOTA_UNITS['history.list']))
+                self._record_fetch_stat('http_requests', 1)
+                response = service.users().history().list(
+                    userId='me', startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'], pageToken=page_token
+                ).execute(num_retries=self.config.FETCH_MAX_RETRIES)
+                
+                for record in response.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        msg_id = added['message']['id']
+                        if msg_id not in seen:
+                            seen.add(msg_id)
+                            message_ids.append(msg_id)
+                
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    return message_ids
+        except Exception as e:
+            print(f"⚠️ DEBUG: Historique Gmail indisponible depuis {start_history_id}, requête complète: {e}")
+            return None
+    
+    def _is_from_group(self, message, group_emails):
+        """Vérifie si l'expéditeur d'un message fait partie des emails du groupe"""
+        headers = message.get('payload', {}).get('headers', [])
+        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), '').lower()
+        return any(email.lower() in sender for email in group_emails)
+    
     def list_messages(self, service, query):
-        """Récupère la liste des messages Gmail"""
+        """Récupère la liste complète des messages Gmail (toutes les pages)"""
         try:
-            response = service.users().messages().list(userId='me', q=query).execute()
-            return response.get('messages', [])
+            return [{'id': msg_id} for msg_id in self.iter_messages(service, query)]
         except Exception as e:
             st.error(f"Erreur lors de la récupération des emails: {e}")
             return []
@@ -919,18 +1099,126 @@ class NewsletterManager:
             st.error(f"Erreur lors de la récupération du message: {e}")
             return None
     
+    def get_messages_batch(self, service, msg_ids, message_format='full'):
+        """Récupère plusieurs messages Gmail via l'endpoint batch (jusqu'à 100 par requête)
+        
+        message_format='metadata' ne télécharge que les en-têtes utiles au filtrage
+        (Config.GMAIL_METADATA_HEADERS), sans le corps du message. Les requêtes batch
+        sont réparties sur fetch_concurrency threads.
+        """
+        get_params = {'userId': 'me', 'format': message_format}
+        if message_format == 'metadata':
+            get_params['metadataHeaders'] = self.config.GMAIL_METADATA_HEADERS
+        
+        # Découper pour occuper tous les workers, sans descendre sous 10 messages par batch
+        concurrency = max(1, int(self.fetch_concurrency))
+        chunk_size = min(self.config.GMAIL_BATCH_SIZE, max(10, -(-len(msg_ids) // concurrency)))
+        chunks = [msg_ids[start:start + chunk_size] for start in range(0, len(msg_ids), chunk_size)]
+        
+        if len(chunks) > 1 and concurrency > 1:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as executor:
+                results = list(executor.map(lambda chunk: self._execute_batch_chunk(service, chunk, get_params), chunks))
+        else:
+            results = [self._execute_batch_chunk(service, chunk, get_params) for chunk in chunks]
+        
+        fetched = {}
+        for result in results:
+            fetched.update(result)
+        
+        # Conserver l'ordre de la liste Gmail
+        return [fetched[msg_id] for msg_id in msg_ids if msg_id in fetched]
+    
+    def _execute_batch_chunk(self, service, msg_ids, get_params):
+        """Exécute une requête batch Gmail en respectant le quota, avec nouvelles tentatives (429/5xx)"""
+        fetched = {}
+        pending = list(msg_ids)
+        units = self.config.GMAIL_QUOTA_UNITS['messages.get']
+        
+        for attempt in range(self.config.FETCH_MAX_RETRIES + 1):
+            retry_ids = []
+            
+            def on_response(request_id, response, exception):
+                if exception is None:
+                    fetched[request_id] = response
+                elif is_retryable_error(exception):
+                    retry_ids.append(request_id)
+                else:
+                    print(f"❌ DEBUG: Erreur récupération message {request_id}: {exception}")
+            
+            batch = service.new_batch_http_request(callback=on_response)
+            for msg_id in pending:
+                batch.add(service.users().messages().get(id=msg_id, **get_params), request_id=msg_id)
+            
+            self._record_fetch_stat('throttle_wait', self.rate_limiter.acquire(units * len(pending)))
+            self._record_fetch_stat('http_requests', 1)
+            try:
+                # Client HTTP du thread courant (service de secure_auth.build_gmail_service)
+                batch.execute()
+            except Exception as e:
+                if isinstance(e, HttpError) and not is_retryable_error(e):
+                    print(f"❌ DEBUG: Erreur requête batch Gmail: {e}")
+                    break
+                print(f"⚠️ DEBUG: Requête batch Gmail interrompue (tentative {attempt + 1}): {e}")
+                retry_ids = [msg_id for msg_id in pending if msg_id not in fetched]
+            
+            if not retry_ids:
+                break
+            if attempt == self.config.FETCH_MAX_RETRIES:
+                print(f"❌ DEBUG: {len(retry_ids)} messages abandonnés après {attempt + 1} tentatives")
+                break
+            
+            self._record_fetch_stat('retries', len(retry_ids))
+            time.sleep(backoff_delay(attempt))
+            pending = retry_ids
+        
+        self._record_fetch_stat('messages', len(fetched))
+        return fetched
+    
+    def _reset_fetch_stats(self):
+        """Réinitialise les statistiques de récupération Gmail du run"""
+        self.fetch_stats = {
+            'wall_time': 0.0,
+            'http_requests': 0,
+            'messages': 0,
+            'retries': 0,
+            'throttle_wait': 0.0
+        }
+    
+    def _record_fetch_stat(self, key, value):
+        """Cumule une statistique de récupération (appelé depuis plusieurs threads)"""
+        with self._stats_lock:
+            self.fetch_stats[key] += value
+    
+    def _body_cache_key(self, msg_id):
+        """Clé du cache des contenus nettoyés : ID Gmail + version du nettoyeur"""
+        return f"{msg_id}:v{self.CLEANER_VERSION}"
+    
     def get_message_body(self, message):
-        """Extrait le contenu textuel d'un message et le nettoie"""
+        """Extrait le contenu textuel d'un message et le nettoie (avec cache disque)"""
         try:
+            cache_key = self._body_cache_key(message['id']) if message.get('id') else None
+            if cache_key:
+                cached_body = self.body_cache.get(cache_key)
+                if cached_body is not None:
+                    return cached_body
+            
+            content = None
             parts = message['payload'].get('parts', [])
             if parts:
                 for part in parts:
                     if part['mimeType'] == 'text/plain':
                         content = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                        return self.clean_email_content(content)
+                        break
             else:
                 content = base64.urlsafe_b64decode(message['payload']['body']['data']).decode('utf-8')
-                return self.clean_email_content(content)
+            
+            if content is None:
+                return None
+            
+            body = self.clean_email_content(content)
+            if cache_key and body:
+                self.body_cache.set(cache_key, body)
+            return body
         except Exception as e:
             st.error(f"Erreur lors de l'extraction du contenu: {e}")
             return None
@@ -940,96 +1228,107 @@ class NewsletterManager:
         if not content:
             return ""
         
-        import re
-        from bs4 import BeautifulSoup
-        
-        # 1. Supprimer le HTML (garder seulement le texte)
-        try:
-            soup = BeautifulSoup(content, 'html.parser')
-            # Supprimer les scripts, styles, et métadonnées
-            for script in soup(["script", "style", "meta", "head"]):
-                script.decompose()
-            content = soup.get_text()
-        except:
-            # Si BeautifulSoup échoue, utiliser regex simple
-            content = re.sub(r'<[^>]+>', '', content)
-        
-        # 2. Supprimer les headers d'email
-        lines = content.split('\n')
-        cleaned_lines = []
-        in_body = False
-        
-        for line in lines:
-            # Détecter le début du corps (après les headers)
-            if not in_body and (line.strip() == '' or 
-                              not line.startswith(('From:', 'To:', 'Subject:', 'Date:', 'Message-ID:', 'X-', 'Return-Path:', 'Received:'))):
-                in_body = True
-            
-            if in_body:
-                cleaned_lines.append(line)
-        
-        content = '\n'.join(cleaned_lines)
-        
-        # 3. Supprimer les signatures communes
-        signature_patterns = [
-            r'(?i)sent from my .*',
-            r'(?i)envoyé depuis mon .*',
-            r'(?i)get outlook for .*',
-            r'(?i)disponible sur .*',
-            r'(?i)powered by .*',
-            r'(?i)confidentialité.*',
-            r'(?i)privacy.*',
-            r'(?i)unsubscribe.*',
-            r'(?i)désabonnement.*',
-            r'(?i)vous recevez cet email.*',
-            r'(?i)this email was sent.*',
-        ]
-        
-        for pattern in signature_patterns:
-            content = re.sub(pattern, '', content, flags=re.MULTILINE | re.DOTALL)
-        
-        # 4. Nettoyer les espaces et lignes vides
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)  # Max 2 sauts de ligne
-        content = re.sub(r'[ \t]+', ' ', content)  # Normaliser les espaces
-        content = content.strip()
-        
-        # 5. Supprimer les URLs longues (garder seulement le texte des liens)
-        content = re.sub(r'https?://[^\s]+', '[LIEN]', content)
-        
-        # 6. Supprimer les caractères de contrôle et spéciaux
-        content = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f]', '', content)
-        
-        print(f"🧹 DEBUG: Contenu nettoyé - Avant: {len(content)} caractères")
+        cleaned = clean_email_content(content)
+        print(f"🧹 DEBUG: Contenu nettoyé - Avant: {len(content)} caractères, après: {len(cleaned)} caractères")
         
-        return content
+        return cleaned
+    
+    # Liens de redirection (tracking) présents dans les résumés
+    REDIRECT_LINK_PATTERN = re.compile(r'(https?://\S*redirect\S*)')
+    
+    # Redirection côté page (<meta http-equiv="refresh" content="0; URL=...">)
+    META_REFRESH_PATTERN = re.compile(r'URL=([^"]+)')
     
     def resolve_url(self, url):
-        """Résout les URLs de redirection"""
+        """Résout une URL de redirection (résultat mémorisé, y compris entre exécutions)"""
+        cached = self.url_cache.get(url)
+        if cached is not None:
+            return cached
+        
+        resolved_url = self._fetch_resolved_url(url)
+        if resolved_url is not None:
+            self.url_cache.set(url, resolved_url)
+            return resolved_url
+        return url
+    
+    def _fetch_resolved_url(self, url):
+        """URL finale après redirections, ou None si elle n'a pas pu être déterminée
+        
+        HEAD d'abord (sans corps) ; si le serveur le refuse ou ne redirige pas, GET en
+        streaming : le corps n'est lu (début seulement) que pour chercher une
+        redirection côté page.
+        """
+        session = get_session()
+        timeout = self.config.URL_RESOLVE_TIMEOUT
         try:
-            response = requests.get(url, headers=self.config.HEADERS, 
-                                  allow_redirects=True, timeout=10)
-            if response.url == url:
-                match = re.search(r'URL=([^"]+)', response.text)
+            response = session.head(url, headers=self.config.HEADERS, allow_redirects=True, timeout=timeout)
+            response.close()
+            if response.ok and response.url != url:
+                return response.url
+            
+            with session.get(url, headers=self.config.HEADERS, allow_redirects=True,
+                             timeout=timeout, stream=True) as response:
+                if response.url != url:
+                    return response.url
+                head = next(response.iter_content(self.config.URL_RESOLVE_MAX_BYTES, decode_unicode=False), b'')
+                match = self.META_REFRESH_PATTERN.search(head.decode(response.encoding or 'utf-8', errors='replace'))
                 if match:
                     return match.group(1).split('?')[0]
-                else:
-                    return url
-            else:
-                return response.url
+                return url
         except requests.RequestException:
-            return url
+            return None
     
     def replace_redirected_links(self, summary):
-        """Remplace les liens de redirection par les URLs finales"""
-        pattern = re.compile(r'(https?://\S*redirect\S*)')
-        matches = pattern.findall(summary)
-        for match in matches:
-            resolved_url = self.resolve_url(match)
-            summary = summary.replace(match, resolved_url)
-        return summary
+        """Remplace les liens de redirection par les URLs finales
+        
+        Chaque URL distincte est résolue une seule fois, en parallèle, puis tous les
+        liens sont remplacés en un seul passage.
+        """
+        urls = list(dict.fromkeys(self.REDIRECT_LINK_PATTERN.findall(summary)))
+        if not urls:
+            return summary
+        
+        max_workers = min(self.config.URL_RESOLVE_CONCURRENCY, len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resolved = dict(zip(urls, executor.map(self.resolve_url, urls)))
+        
+        return self.REDIRECT_LINK_PATTERN.sub(lambda match: resolved[match.group(1)], summary)
+    
+    def classify_promotional(self, messages):
+        """Classe un lot de messages (en-têtes) en un seul appel : True = promotionnel
+        
+        Classifieur local (NumPy) si disponible, sinon mots-clés du sujet.
+        """
+        classifier = None
+        if self.config.PROMO_CLASSIFIER_ENABLED:
+            try:
+                classifier = get_default_classifier(self.config.PROMO_TRAINING_DATA, self.config.PROMO_CLASSIFIER_THRESHOLD)
+            except Exception as e:
+                print(f"⚠️ DEBUG: Classifieur promotionnel indisponible, mots-clés utilisés: {e}")
+        
+        if classifier is None:
+            return [self._is_promotional_by_keywords(message) for message in messages]
+        
+        fields_list = [message_fields(message) for message in messages]
+        probabilities = classifier.predict_proba(fields_list)
+        results = []
+        for fields, probability in zip(fields_list, probabilities):
+            is_promotional = bool(probability >= classifier.threshold)
+            print(f"🔍 DEBUG: Classification email - Sujet: '{fields['subject'][:50]}...' → {'PROMOTIONNEL' if is_promotional else 'EDITORIAL'} ({probability:.2f})")
+            results.append(is_promotional)
+        return results
     
     def is_promotional_email(self, message):
-        """Détecte si un email est promotionnel en analysant le sujet"""
+        """Détecte si un email est promotionnel (sujet, expéditeur, List-Id)"""
+        try:
+            return self.classify_promotional([message])[0]
+        except Exception as e:
+            print(f"❌ DEBUG: Erreur classification email: {e}")
+            # En cas d'erreur, considérer comme non-promotionnel pour ne pas perdre de contenu
+            return False
+    
+    def _is_promotional_by_keywords(self, message):
+        """Détection par mots-clés dans le sujet uniquement (sans NumPy ou classifieur désactivé)"""
         try:
             # Extraire le sujet
             headers = message['payload'].get('headers', [])
@@ -1039,216 +1338,257 @@ class NewsletterManager:
                     subject = header['value']
                     break
             
-            # Détection par mots-clés dans le sujet uniquement
-            is_promotional = self.is_promotional_basic(subject, "")
-            print(f"🔍 DEBUG: Classification email - Sujet: '{subject[:50]}...' → {'PROMOTIONNEL' if is_promotional else 'EDITORIAL'}")
-            return is_promotional
+            keywords = self.find_promotional_keywords(subject)
+            print(f"🔍 DEBUG: Classification email - Sujet: '{subject[:50]}...' → {'PROMOTIONNEL ' + str(keywords) if keywords else 'EDITORIAL'}")
+            return bool(keywords)
             
         except Exception as e:
             print(f"❌ DEBUG: Erreur classification email: {e}")
             # En cas d'erreur, considérer comme non-promotionnel pour ne pas perdre de contenu
             return False
     
+    def find_promotional_keywords(self, subject):
+        """Mots-clés promotionnels présents dans le sujet (mots entiers, sans tenir compte des accents)"""
+        return PROMOTIONAL_MATCHER.find_all(subject)
+    
     def is_promotional_basic(self, subject, content):
         """Détection basique par mots-clés (fallback si l'IA échoue)"""
-        promotional_keywords = [
-            # Mots-clés de réduction/offre
-            'offre', 'réduction', 'promo', 'code', 'rabais', 'discount', 'remise',
-            'moitié prix', 'prix cassé', 'prix barré', 'économie', 'économisez',
-            'profitez', 'spécial', 'limité', 'urgent', 'flash', 'éclair',
-            
-            # Mots-clés d'achat/vente
-            'vente', 'achat', 'commander', 'boutique', 'shop', 'store', 'magasin',
-            'commande', 'panier', 'ajouter au panier', 'livraison', 'expédition',
-            'paiement', 'carte bancaire', 'cb', 'paypal', 'stripe',
-            
-            # Mots-clés promotionnels
-            'gratuit', 'free', 'deal', 'bargain', 'sale', 'clearance', 'liquidation',
-            'soldes', 'promotion', 'cadeau', 'gift', 'bonus', 'prime',
-            'exclusif', 'exclusive', 'réservé', 'private', 'vip',
-            
-            # Mots-clés d'urgence/pression
-            'dépêchez-vous', 'hâtez-vous', 'fin', 'dernière', 'dernières heures',
-            'bientôt fini', 'stock limité', 'quantité limitée', 'plus que',
-            'ne manquez pas', 'occasion unique', 'une seule fois',
-            
-            # Mots-clés d'abonnement
-            'abonnement', 'subscription', 's\'abonner', 'subscribe', 'newsletter',
-            'inscription', 'inscrivez-vous', 'rejoignez', 'join', 'adhésion',
-            
-            # Mots-clés commerciaux
-            'client', 'customer', 'satisfaction', 'garantie', 'warranty',
-            'service client', 'support', 'aide', 'help', 'contact',
-            'devis', 'quote', 'estimation', 'tarif', 'prix'
-        ]
+        return PROMOTIONAL_MATCHER.matches(subject)
+    
+    def summarize_newsletter(self, content, custom_prompt=""):
+        """Utilise OpenAI pour extraire les actualités en map-reduce
         
-        text_to_analyze = f"{subject}".lower()
+        Les actualités de chaque email sont mémorisées par empreinte de contenu
+        normalisé : un même numéro de newsletter reçu par plusieurs utilisateurs ou
+        groupes n'est analysé qu'une fois. Map : les emails restants sont regroupés
+        (ou découpés) selon le budget de tokens puis analysés en parallèle.
+        Reduce : les actualités sont fusionnées dans le template HTML de l'email.
+        content est une liste de corps d'emails (une chaîne est découpée sur le
+        séparateur '--- NOUVEL EMAIL ---').
+        """
+        emails = content if isinstance(content, list) else content.split(self.EMAIL_SEPARATOR)
         
-        for keyword in promotional_keywords:
-            if keyword in text_to_analyze:
-                print(f"🔍 DEBUG: Mot-clé promotionnel détecté: '{keyword}'")
-                return True
+        # Actualités déjà extraites pour un contenu identique
+        memo_keys = [self._email_memo_key(email, custom_prompt) for email in emails]
+        items_by_email = {}
+        for index, email in enumerate(emails):
+            if email.strip():
+                cached = self.email_items_cache.get(memo_keys[index])
+                if cached is not None:
+                    items_by_email[index] = json.loads(cached)
+        if items_by_email:
+            print(f"⚡ DEBUG: {len(items_by_email)}/{len(emails)} emails déjà résumés (cache partagé)")
         
-        print(f"🔍 DEBUG: Aucun mot-clé promotionnel détecté")
-        return False
+        # Répartir les emails restants dans le budget de tokens disponible pour le contenu
+        budget = self._get_token_budget()
+        overhead_tokens = budget.count_messages(self._build_map_messages("", custom_prompt))
+        content_budget = budget.content_budget(overhead_tokens)
+        pending_emails = ["" if index in items_by_email else email for index, email in enumerate(emails)]
+        packs = budget.pack(pending_emails, content_budget, separator_tokens=budget.count("--- EMAIL 00 ---\n\n"))
+        map_contents = [self._format_map_content(pack) for pack in packs]
+        
+        if map_contents:
+            print(f"🔍 DEBUG: Map - {len(map_contents)} appels OpenAI pour {len(emails) - len(items_by_email)} emails "
+                  f"(budget contenu: {content_budget} tokens/appel, prompt: {overhead_tokens} tokens)")
+            if hasattr(st, 'info'):
+                st.info(f"🔍 Analyse de {len(emails)} emails ({len(map_contents)} appels OpenAI en parallèle)")
+        
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.config.SUMMARY_MAX_CONCURRENCY) as executor:
+            results = list(executor.map(lambda map_content: self._extract_news_items(map_content, custom_prompt), map_contents))
+        
+        # Attribuer les actualités à leur email d'origine pour les mémoriser
+        extracted = {}
+        unattributed = []
+        not_memoizable = set()
+        for pack, (pack_items, usage) in zip(packs, results):
+            pack_indexes = [index for index, _ in pack]
+            for index in pack_indexes:
+                extracted.setdefault(index, [])
+            if usage.get('error'):
+                not_memoizable.update(pack_indexes)
+                continue
+            for item in pack_items:
+                position = item.pop('email', None)
+                if len(pack) == 1:
+                    extracted[pack_indexes[0]].append(item)
+                elif isinstance(position, int) and 1 <= position <= len(pack):
+                    extracted[pack_indexes[position - 1]].append(item)
+                else:
+                    unattributed.append(item)
+                    not_memoizable.update(pack_indexes)
+        
+        for index, email_items in extracted.items():
+            if index not in not_memoizable:
+                self.email_items_cache.set(memo_keys[index], json.dumps(email_items, ensure_ascii=False))
+        
+        # Consommation de tokens du groupe (estimée avant l'appel, réelle d'après l'API)
+        self.token_usage = {
+            'model': budget.model,
+            'calls': len(map_contents),
+            'estimated_prompt_tokens': sum(overhead_tokens + budget.count(map_content) for map_content in map_contents),
+            'prompt_tokens': sum(usage.get('prompt_tokens', 0) for _, usage in results),
+            'completion_tokens': sum(usage.get('completion_tokens', 0) for _, usage in results),
+            'cache_hits': sum(1 for _, usage in results if usage.get('cached')),
+            'memoized_emails': len(items_by_email)
+        }
+        print(f"📊 DEBUG: Tokens ({budget.model}) - {self.token_usage['calls']} appels "
+              f"({self.token_usage['cache_hits']} servis par le cache, {self.token_usage['memoized_emails']} emails mémorisés), "
+              f"prompt: {self.token_usage['prompt_tokens']} (estimé {self.token_usage['estimated_prompt_tokens']}), "
+              f"réponse: {self.token_usage['completion_tokens']}")
+        
+        # Reduce : fusionner les actualités dans l'ordre des emails (sans doublons de titre)
+        partial_items = [items_by_email.get(index, extracted.get(index, [])) for index in range(len(emails))]
+        partial_items.append(unattributed)
+        items = []
+        seen_titles = set()
+        for email_items in partial_items:
+            for item in email_items:
+                title_key = re.sub(r'\W+', ' ', item['title']).strip().lower()
+                if title_key and title_key not in seen_titles:
+                    seen_titles.add(title_key)
+                    items.append(item)
+        
+        print(f"🔍 DEBUG: Reduce - {len(items)} actualités retenues en {time.time() - started:.2f}s")
+        if not items:
+            if hasattr(st, 'warning'):
+                st.warning("⚠️ L'IA n'a trouvé aucune actualité importante")
+            return ""
+        
+        return self._render_summary_html(items)
     
-    def summarize_newsletter(self, content, custom_prompt=""):
-        """Utilise OpenAI pour extraire les actualités IA"""
-        if len(content) > 32000:
-            content = content[:32000]
+    def _email_memo_key(self, email, custom_prompt=""):
+        """Clé de mémorisation d'un email : empreinte de son contenu normalisé
         
-        # Template HTML pour l'email
-        html_template = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-                .header { padding: 20px; text-align: center; margin-bottom: 20px; }
-                .header img { max-width: 80px; vertical-align: middle; margin-right: 10px; }
-                .header .brand { display: inline-block; vertical-align: middle; font-weight: bold; color: #667eea; font-size: 24px; }
-                .header .subtitle { color: #666; font-size: 18px; margin-top: 5px; }
-                .section { background: #f8f9fa; margin: 15px 0; padding: 15px; border-radius: 6px; border-left: 4px solid #667eea; }
-                .section-title { color: #2c3e50; font-size: 18px; font-weight: bold; margin-bottom: 10px; }
-                .section-content { color: #555; }
-                .footer { padding: 15px; text-align: center; margin-top: 20px; }
-                .footer .subtitle { color: #666; font-size: 14px; margin-top: 5px; }
-                a { color: #667eea; text-decoration: none; }
-                a:hover { text-decoration: underline; }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <img src="https://raw.githubusercontent.com/AlexisMetton/AutoBrief/main/public/assets/logo_autobrief.png" alt="AutoBrief">
-                <span class="brand">AutoBrief</span>
-                <div class="subtitle">Actualités du {date}</div>
-            </div>
-            
-            {sections}
-            
-            <div class="footer">
-                <div class="subtitle">Généré automatiquement par AutoBrief</div>
-            </div>
-        </body>
-        </html>
+        La normalisation ignore la casse, les espaces, les liens et les adresses email
+        (personnalisations fréquentes d'un destinataire à l'autre).
         """
-        
-        # Prompt de base amélioré
-        base_prompt = f"""Analysez la newsletter suivante et extrayez toutes les actualités importantes. 
+        normalized = email.lower().replace('[lien]', ' ')
+        normalized = re.sub(r'[\w.+-]+@[\w-]+\.[\w.-]+', ' ', normalized)
+        normalized = re.sub(r'\s+', ' ', normalized).strip()
+        content_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        prompt_hash = hashlib.sha256((custom_prompt or "").strip().encode('utf-8')).hexdigest()[:16]
+        return f"{self.config.OPENAI_MODEL}:v{self.SUMMARY_PROMPT_VERSION}:{prompt_hash}:{content_hash}"
+    
+    def _format_map_content(self, pack):
+        """Assemble un lot d'emails pour la phase map (emails numérotés s'il y en a plusieurs)"""
+        if len(pack) == 1:
+            return pack[0][1]
+        return "\n\n".join(f"--- EMAIL {position} ---\n\n{text}" for position, (_, text) in enumerate(pack, start=1))
+    
+    def _get_token_budget(self):
+        """Budget de tokens du modèle configuré"""
+        model = self.config.OPENAI_MODEL
+        return TokenBudget(
+            model,
+            self.config.OPENAI_CONTEXT_WINDOWS.get(model, self.config.DEFAULT_CONTEXT_WINDOW),
+            self.config.SUMMARY_MAX_OUTPUT_TOKENS,
+            self.config.SUMMARY_MAX_INPUT_TOKENS
+        )
+    
+    def _build_map_messages(self, content, custom_prompt=""):
+        """Construit les messages OpenAI de la phase map"""
+        base_prompt = """Analysez la newsletter suivante et extrayez toutes les actualités importantes. 
             Ne gardez AUCUN lien dans le résumé. Supprimez tous les liens d'affiliation, 
             d'auto-promotion, substack, liens vers d'autres articles du même auteur et tous les autres liens. 
             Ne gardez pas de référence à l'auteur, à la newsletter ou à substack.
+            Le contenu peut regrouper plusieurs emails, chacun précédé de '--- EMAIL n ---'.
             
             IMPORTANT: 
             - Le résumé doit être en français
             - Gardez toutes les informations importantes et résumez-les ou expliquez-les
             - IMPORTANT: Ne mettez AUCUN lien dans le contenu, seulement le texte des actualités
-            - Vous DEVEZ utiliser EXACTEMENT ce template HTML pour votre réponse :
-            
-            {html_template}
-            
-            - Remplacez {{date}} par la date actuelle (format: DD/MM/YYYY)
-            - Remplacez {{sections}} par vos sections d'actualités
-            - Chaque actualité doit être dans une div avec class="section"
-            - Chaque section doit avoir un titre dans une div avec class="section-title"
-            - Le contenu va dans une div avec class="section-content"
-            - Une actualité par section
-            - IMPORTANT: Retournez TOUT le HTML complet, pas juste les sections
-            - COMMENCEZ DIRECTEMENT par <!DOCTYPE html> - ne mettez rien avant
-            - Si aucune actualité importante n'est trouvée, retournez une chaîne vide
-            
-            EXEMPLE de structure attendue :
-            <div class="section">
-                <div class="section-title">Titre de l'actualité</div>
-                <div class="section-content">Résumé avec liens...</div>
-            </div>
+            - Une actualité par élément, avec un titre court et un contenu en texte brut (pas de HTML)
+            - Indiquez pour chaque actualité le numéro de l'email d'origine (1 s'il n'y a qu'un email)
+            - Si aucune actualité importante n'est trouvée, retournez une liste vide
             
             Retournez votre réponse sous forme de JSON avec la structure suivante :
-            {{"result": "votre_html_complet_ici"}}"""
+            {"items": [{"email": 1, "title": "Titre de l'actualité", "content": "Résumé de l'actualité"}]}"""
         
         # Ajouter le prompt personnalisé s'il existe
         if custom_prompt and custom_prompt.strip():
-            full_prompt = f"{base_prompt}\n\nInstructions supplémentaires: {custom_prompt.strip()}\n\n{content}\n\nGénérez un email HTML complet en français avec toutes les actualités importantes trouvées. COMMENCEZ DIRECTEMENT par <!DOCTYPE html>. Retournez le résultat en JSON avec la clé 'result'. Si aucune actualité importante n'est trouvée, retournez {{'result': ''}}."
+            full_prompt = f"{base_prompt}\n\nInstructions supplémentaires: {custom_prompt.strip()}\n\n{content}"
         else:
-            full_prompt = f"{base_prompt}\n\n{content}\n\nGénérez un email HTML complet en français avec toutes les actualités importantes trouvées. COMMENCEZ DIRECTEMENT par <!DOCTYPE html>. Retournez le résultat en JSON avec la clé 'result'. Si aucune actualité importante n'est trouvée, retournez {{'result': ''}}."
+            full_prompt = f"{base_prompt}\n\n{content}"
         
-        messages = [
+        return [
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": full_prompt}
         ]
+    
+    def _extract_news_items(self, content, custom_prompt=""):
+        """Phase map : extrait les actualités d'un lot d'emails (ou d'un morceau d'email)
+        
+        Retourne (actualités, consommation de tokens). Appelée depuis des threads :
+        n'utilise pas les fonctions d'affichage Streamlit.
+        """
+        messages = self._build_map_messages(content, custom_prompt)
+        
+        # Réponse déjà obtenue pour ce prompt exact (test répété, relance du scheduler)
+        cache_key = hashlib.sha256(
+            json.dumps([self.config.OPENAI_MODEL, messages, custom_prompt or ""], ensure_ascii=False).encode('utf-8')
+        ).hexdigest()
+        cached = self.llm_cache.get(cache_key)
+        if cached is not None:
+            cached = json.loads(cached)
+            print(f"⚡ DEBUG: Réponse OpenAI servie depuis le cache (latence économisée: {cached['latency']:.2f}s)")
+            return [dict(item) for item in cached['items']], {'cached': True}
         
         try:
-            print(f"🔍 DEBUG: Appel OpenAI avec {len(full_prompt)} caractères de prompt")
-            if hasattr(st, 'info'):
-                st.info(f"🔍 Appel OpenAI avec {len(full_prompt)} caractères")
-            
+            print(f"🔍 DEBUG: Appel OpenAI avec {len(messages[-1]['content'])} caractères de prompt")
+            started = time.time()
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.config.OPENAI_MODEL,
                 response_format={"type": "json_object"},
                 messages=messages,
             )
+            latency = time.time() - started
             
-            print(f"🔍 DEBUG: Réponse OpenAI reçue")
-            if hasattr(st, 'info'):
-                st.info("📡 Réponse OpenAI reçue")
+            usage = {}
+            if getattr(response, 'usage', None):
+                usage = {
+                    'prompt_tokens': response.usage.prompt_tokens,
+                    'completion_tokens': response.usage.completion_tokens
+                }
             
-            # Vérifier que la réponse n'est pas vide
             response_content = response.choices[0].message.content
             if not response_content or response_content.strip() == "":
                 print(f"❌ DEBUG: Réponse OpenAI vide")
-                if hasattr(st, 'error'):
-                    st.error("❌ Réponse OpenAI vide")
-                return ""
-            
-            print(f"🔍 DEBUG: Contenu réponse: '{response_content[:100]}...'")
-            if hasattr(st, 'info'):
-                st.info(f"📄 Contenu reçu: '{response_content[:100]}...'")
-            
-            # Afficher la réponse complète de ChatGPT
-            print(f"🔍 DEBUG: RÉPONSE COMPLÈTE CHATGPT:")
-            print(f"'{response_content}'")
-            if hasattr(st, 'write'):
-                st.write("🔍 **Réponse complète ChatGPT:**")
-                st.code(response_content, language="json")
-            
-            try:
-                data = json.loads(response_content)
-                print(f"🔍 DEBUG: JSON parsé: {list(data.keys())}")
-                if hasattr(st, 'info'):
-                    st.info(f"✅ JSON parsé: {list(data.keys())}")
-            except json.JSONDecodeError as json_error:
-                print(f"❌ DEBUG: Erreur parsing JSON: {json_error}")
-                print(f"❌ DEBUG: Contenu reçu: '{response_content}'")
-                if hasattr(st, 'error'):
-                    st.error(f"❌ Erreur JSON: {json_error}")
-                    st.error(f"Contenu: {response_content}")
-                return ""
-            
-            if 'result' in data and isinstance(data['result'], str):
-                result = data['result']
-                print(f"🔍 DEBUG: Résultat IA: {len(result)} caractères")
-                print(f"🔍 DEBUG: Premiers 200 caractères: {result[:200]}...")
-                
-                if len(result.strip()) == 0:
-                    if hasattr(st, 'warning'):
-                        st.warning("⚠️ L'IA a retourné une chaîne vide")
-                    return ""
-                
-                # Debug pour voir ce que l'IA génère
-                if hasattr(st, 'write'):
-                    st.write(f"🔍 Debug: HTML généré par l'IA (premiers 500 caractères): {result[:500]}...")
-                return result
-            else:
-                print(f"❌ DEBUG: Pas de 'result' valide dans la réponse: {data}")
-                if hasattr(st, 'error'):
-                    st.error(f"❌ Pas de 'result' valide: {data}")
-                return ""
+                return [], {**usage, 'error': True}
+            
+            data = json.loads(response_content)
+            items = []
+            for item in data.get('items', []):
+                if isinstance(item, dict) and str(item.get('title', '')).strip() and str(item.get('content', '')).strip():
+                    news_item = {'title': str(item['title']).strip(), 'content': str(item['content']).strip()}
+                    try:
+                        news_item['email'] = int(item['email'])
+                    except (KeyError, TypeError, ValueError):
+                        pass
+                    items.append(news_item)
+            print(f"🔍 DEBUG: {len(items)} actualités extraites en {latency:.2f}s")
+            self.llm_cache.set(cache_key, json.dumps({'items': items, 'latency': latency}, ensure_ascii=False))
+            return items, usage
+        except json.JSONDecodeError as json_error:
+            print(f"❌ DEBUG: Erreur parsing JSON: {json_error}")
+            return [], {'error': True}
         except Exception as e:
             print(f"❌ DEBUG: Erreur OpenAI: {e}")
-            if hasattr(st, 'error'):
-                st.error(f"Erreur OpenAI: {e}")
-            return ""
+            return [], {'error': True}
+    
+    def _render_summary_html(self, items):
+        """Phase reduce : insère les actualités dans le template HTML de l'email"""
+        sections = "\n".join(
+            f"""            <div class="section">
+                <div class="section-title">{html.escape(item['title'])}</div>
+                <div class="section-content">{html.escape(item['content'])}</div>
+            </div>"""
+            for item in items
+        )
+        return (self.SUMMARY_HTML_TEMPLATE
+                .replace('{date}', datetime.now().strftime('%d/%m/%Y'))
+                .replace('{sections}', sections.strip())
+                .strip())
     
     def process_newsletters_scheduler(self, days=7, send_email=False):
         """Version simplifiée pour le scheduler (sans Streamlit)"""
@@ -1280,15 +1620,22 @@ class NewsletterManager:
         
         return results if results else None
     
-    def process_single_group(self, group_title, group_settings):
-        """Traite un groupe de newsletters spécifique"""
+    def process_single_group(self, group_title, group_settings, incremental=False):
+        """Traite un groupe de newsletters spécifique
+        
+        En mode incrémental (scheduler), seuls les messages arrivés depuis le
+        dernier historyId connu du groupe sont récupérés via users.history.list ;
+        les messages déjà traités sont ignorés.
+        """
         try:
             # Récupérer les emails du groupe
             newsletter_groups = self.get_newsletter_groups()
             group_emails = []
+            sync_state = {}
             for group in newsletter_groups:
                 if group.get('title') == group_title:
                     group_emails = group.get('emails', [])
+                    sync_state = group.get('sync_state') or {}
                     break
             
             if not group_emails:
@@ -1307,70 +1654,94 @@ class NewsletterManager:
             custom_prompt = group_settings.get('custom_prompt', '')
             notification_email = group_settings.get('notification_email', '')
             
-            print(f"🔍 DEBUG: Paramètres groupe - jours: {days_to_analyze}, prompt: '{custom_prompt[:50]}...'")
-            
-            # Créer la requête pour ce groupe
-            query = self.get_query_for_emails(group_emails, days_to_analyze)
-            print(f"🔍 DEBUG: Requête Gmail pour groupe: {query}")
+            self.fetch_concurrency = group_settings.get('max_fetch_concurrency', self.config.MAX_FETCH_CONCURRENCY)
             
-            # Récupérer les messages
-            results = service.users().messages().list(userId='me', q=query).execute()
-            messages = results.get('messages', [])
-            print(f"🔍 DEBUG: {len(messages)} messages trouvés pour le groupe")
+            print(f"🔍 DEBUG: Paramètres groupe - jours: {days_to_analyze}, prompt: '{custom_prompt[:50]}...'")
             
-            if not messages:
+            self._reset_fetch_stats()
+            fetch_started = time.time()
+            
+            # Relever l'historyId courant avant le listing pour ne rien manquer au prochain run
+            # (il n'est enregistré que si tous les messages listés ont été récupérés)
+            current_history_id = self.get_current_history_id(service) if incremental else None
+            processed_ids = sync_state.get('processed_ids', []) if incremental else []
+            already_processed = set(processed_ids)
+            
+            # Mode incrémental : seulement les messages ajoutés depuis le dernier run
+            message_ids = None
+            history_filter = None
+            if incremental and sync_state.get('history_id'):
+                history_ids = self.list_history_message_ids(service, sync_state['history_id'])
+                if history_ids is not None:
+                    print(f"🔍 DEBUG: Synchronisation incrémentale - {len(history_ids)} nouveaux messages depuis l'historyId {sync_state['history_id']}")
+                    message_ids = iter(history_ids)
+                    # L'historique n'est pas filtré par expéditeur ni par date
+                    not_before = datetime.now() - timedelta(days=days_to_analyze)
+                    history_filter = (group_emails, int(not_before.timestamp() * 1000))
+            
+            if message_ids is None:
+                # Créer la requête pour ce groupe
+                query = self.get_query_for_emails(group_emails, days_to_analyze)
+                print(f"🔍 DEBUG: Requête Gmail pour groupe: {query}")
+                message_ids = self.iter_messages(service, query, page_size=self.config.GMAIL_BATCH_SIZE)
+            
+            # Récupérer les messages page par page : le filtrage et le téléchargement
+            # de chaque page démarrent sans attendre la fin du listing
+            total_messages = 0
+            group_message_ids = []
+            failed_ids = []
+            email_bodies = []
+            message_ids = (msg_id for msg_id in message_ids if msg_id not in already_processed)
+            while True:
+                page_ids = list(islice(message_ids, self.config.GMAIL_BATCH_SIZE))
+                if not page_ids:
+                    break
+                total_messages += len(page_ids)
+                print(f"🔍 DEBUG: {len(page_ids)} messages reçus (total: {total_messages})")
+                
+                page_bodies, page_group_ids, page_failed_ids = self._fetch_editorial_bodies(service, page_ids, history_filter)
+                email_bodies.extend(page_bodies)
+                group_message_ids.extend(page_group_ids)
+                failed_ids.extend(page_failed_ids)
+            
+            self.fetch_stats['wall_time'] = time.time() - fetch_started
+            print(f"🔍 DEBUG: {total_messages} messages trouvés pour le groupe")
+            print(f"📊 DEBUG: Récupération Gmail en {self.fetch_stats['wall_time']:.2f}s - "
+                  f"{self.fetch_stats['messages']} messages, {self.fetch_stats['http_requests']} requêtes HTTP, "
+                  f"{self.fetch_stats['retries']} nouvelles tentatives, attente quota {self.fetch_stats['throttle_wait']:.2f}s "
+                  f"(concurrence: {self.fetch_concurrency})")
+            
+            if not total_messages:
                 print(f"❌ DEBUG: Aucun message trouvé pour le groupe '{group_title}'")
                 return None
             
-            # Filtrer les emails promotionnels
-            filtered_messages = []
-            for idx, msg in enumerate(messages):
-                print(f"🔍 DEBUG: Analyse message {idx + 1}/{len(messages)} du groupe")
-                message = self.get_message(service, msg['id'])
-                
-                if message:
-                    is_promotional = self.is_promotional_email(message)
-                    if is_promotional:
-                        print(f"🚫 DEBUG: Email {idx + 1} détecté comme promotionnel - ignoré")
-                    else:
-                        print(f"✅ DEBUG: Email {idx + 1} validé comme contenu éditorial")
-                        filtered_messages.append(msg)
-                else:
-                    print("❌ DEBUG: Impossible de récupérer le message")
-            
-            print(f"🔍 DEBUG: {len(filtered_messages)}/{len(messages)} emails non-promotionnels trouvés pour le groupe")
-            
-            # Traiter seulement les emails non-promotionnels
-            all_content = ""
-            for idx, msg in enumerate(filtered_messages):
-                print(f"🔍 DEBUG: Extraction contenu éditorial {idx + 1}/{len(filtered_messages)} du groupe")
-                message = self.get_message(service, msg['id'])
-                
-                if message:
-                    body = self.get_message_body(message)
-                    if body:
-                        print(f"🔍 DEBUG: Corps du message extrait ({len(body)} caractères)")
-                        if all_content:
-                            all_content += "\n\n--- NOUVEL EMAIL ---\n\n"
-                        all_content += body
-                        print(f"✅ DEBUG: Contenu éditorial ajouté")
-                    else:
-                        print("❌ DEBUG: Impossible d'extraire le corps du message")
-                else:
-                    print("❌ DEBUG: Impossible de récupérer le message")
-            
-            print(f"🔍 DEBUG: Contenu éditorial du groupe: {len(all_content)} caractères")
+            print(f"🔍 DEBUG: Contenu éditorial du groupe: {len(email_bodies)} emails, {sum(len(body) for body in email_bodies)} caractères")
             
             # Générer le résumé pour ce groupe
-            if all_content.strip():
+            if any(body.strip() for body in email_bodies):
                 print(f"🔍 DEBUG: Génération du résumé pour le groupe '{group_title}'...")
-                output = self.summarize_newsletter(all_content, custom_prompt)
+                output = self.summarize_newsletter(email_bodies, custom_prompt)
                 print(f"🔍 DEBUG: Résumé du groupe généré: {len(output) if output else 0} caractères")
                 
                 # Envoyer par email si configuré
                 if output and notification_email and notification_email.strip():
                     self.send_summary_email(output, notification_email, group_title)
                 
+                # État de synchronisation à persister avec la date de dernière exécution.
+                # Des messages non récupérés : l'ancien historyId est conservé pour qu'ils
+                # soient listés à nouveau, processed_ids évitant les doublons.
+                if output and incremental:
+                    history_id = current_history_id
+                    if failed_ids or not current_history_id:
+                        history_id = sync_state.get('history_id')
+                    if failed_ids:
+                        print(f"⚠️ DEBUG: {len(failed_ids)} messages non récupérés - historyId {history_id} conservé pour les retenter")
+                    max_ids = self.config.SYNC_MAX_PROCESSED_IDS
+                    self.pending_sync_states[group_title] = {
+                        'history_id': history_id,
+                        'processed_ids': (processed_ids + group_message_ids)[-max_ids:]
+                    }
+                
                 return output
             else:
                 print(f"❌ DEBUG: Aucun contenu éditorial trouvé pour le groupe '{group_title}'")
@@ -1380,9 +1751,89 @@ class NewsletterManager:
             print(f"❌ DEBUG: Erreur lors du traitement du groupe '{group_title}': {e}")
             return None
     
+    def _fetch_editorial_bodies(self, service, message_ids, history_filter=None):
+        """Filtre les emails promotionnels puis extrait le corps des emails retenus
+        
+        history_filter = (emails du groupe, date minimale en ms) restreint les messages
+        issus de l'historique Gmail aux expéditeurs et à la période du groupe.
+        
+        Retourne (corps éditoriaux, IDs des messages du groupe traités, IDs non récupérés) :
+        seuls les messages du groupe entièrement traités sont mémorisés comme traités, pas
+        ceux des autres messages de la boîte ni ceux dont la récupération a échoué.
+        """
+        # Phase 1 : récupérer uniquement les en-têtes (format=metadata) pour le filtrage
+        metadata_messages = self.get_messages_batch(service, message_ids, message_format='metadata')
+        print(f"🔍 DEBUG: {len(metadata_messages)}/{len(message_ids)} en-têtes récupérés par batch")
+        
+        # Échecs de récupération (tentatives épuisées, erreur non retentable)
+        failed_ids = set(message_ids) - {message['id'] for message in metadata_messages}
+        
+        if history_filter:
+            group_emails, not_before_ms = history_filter
+            metadata_messages = [
+                message for message in metadata_messages
+                if self._is_from_group(message, group_emails)
+                and int(message.get('internalDate', 0)) >= not_before_ms
+            ]
+            print(f"🔍 DEBUG: {len(metadata_messages)} messages de l'historique appartiennent au groupe")
+        
+        # Filtrer les emails promotionnels (tout le lot classé en un seul appel)
+        try:
+            promotional_flags = self.classify_promotional(metadata_messages)
+        except Exception as e:
+            print(f"❌ DEBUG: Erreur classification des emails: {e}")
+            promotional_flags = [self._is_promotional_by_keywords(message) for message in metadata_messages]
+        
+        editorial_ids = []
+        for idx, (message, is_promotional) in enumerate(zip(metadata_messages, promotional_flags)):
+            if is_promotional:
+                print(f"🚫 DEBUG: Email {idx + 1} détecté comme promotionnel - ignoré")
+            else:
+                print(f"✅ DEBUG: Email {idx + 1} validé comme contenu éditorial")
+                editorial_ids.append(message['id'])
+        
+        print(f"🔍 DEBUG: {len(editorial_ids)}/{len(message_ids)} emails non-promotionnels")
+        
+        # Les contenus déjà nettoyés (autre groupe, test précédent) viennent du cache disque
+        bodies = {}
+        for msg_id in editorial_ids:
+            cached_body = self.body_cache.get(self._body_cache_key(msg_id))
+            if cached_body is not None:
+                bodies[msg_id] = cached_body
+        missing_ids = [msg_id for msg_id in editorial_ids if msg_id not in bodies]
+        if bodies:
+            print(f"⚡ DEBUG: {len(bodies)}/{len(editorial_ids)} contenus servis depuis le cache")
+        
+        # Phase 2 : télécharger le contenu complet des seuls emails retenus
+        filtered_messages = self.get_messages_batch(service, missing_ids) if missing_ids else []
+        
+        for idx, message in enumerate(filtered_messages):
+            print(f"🔍 DEBUG: Extraction contenu éditorial {idx + 1}/{len(filtered_messages)}")
+            body = self.get_message_body(message)
+            if body:
+                print(f"🔍 DEBUG: Corps du message extrait ({len(body)} caractères)")
+                bodies[message['id']] = body
+            else:
+                print("❌ DEBUG: Impossible d'extraire le corps du message")
+        
+        failed_ids.update(set(missing_ids) - {message['id'] for message in filtered_messages})
+        
+        group_ids = [message['id'] for message in metadata_messages if message['id'] not in failed_ids]
+        bodies_list = [bodies[msg_id] for msg_id in editorial_ids if bodies.get(msg_id)]
+        return bodies_list, group_ids, [msg_id for msg_id in message_ids if msg_id in failed_ids]
+    
     def update_group_last_run(self, group_title):
-        """Met à jour la date de dernière exécution d'un groupe"""
-        self.update_group_settings(group_title, {'last_run': datetime.now().isoformat()})
+        """Met à jour la date de dernière exécution (et l'état de synchronisation) d'un groupe"""
+        sync_state = self.pending_sync_states.pop(group_title, None)
+        newsletter_groups = self.get_newsletter_groups()
+        for group in newsletter_groups:
+            if group.get('title') == group_title:
+                group.setdefault('settings', {})['last_run'] = datetime.now().isoformat()
+                if sync_state:
+                    group['sync_state'] = sync_state
+                self.save_newsletter_groups(newsletter_groups)
+                return True
+        return False
     
     def update_group_emails(self, group_title, new_emails):
         """Met à jour les emails d'un groupe"""
@@ -1468,12 +1919,6 @@ class NewsletterManager:
     def send_summary_email(self, summary, notification_email, group_title=None):
         """Envoie le résumé par email"""
         try:
-            import smtplib
-            from email.mime.text import MIMEText
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.base import MIMEBase
-            from email import encoders
-            
             # Configuration Gmail (utilise les mêmes credentials OAuth2)
             service = self.auth.get_gmail_service()
             if not service:
@@ -1481,22 +1926,17 @@ class NewsletterManager:
                     st.error("Impossible d'accéder à Gmail pour l'envoi")
                 return False
             
-            # Créer le message
-            message = MIMEMultipart()
-            message['From'] = service.users().getProfile(userId='me').execute()['emailAddress']
-            message['To'] = notification_email
-            
             # Sujet avec nom du groupe si fourni
             if group_title:
-                message['Subject'] = f"Résumé AutoBrief - {group_title} - {datetime.now().strftime('%d/%m/%Y')}"
+                subject = f"Résumé AutoBrief - {group_title} - {datetime.now().strftime('%d/%m/%Y')}"
             else:
-                message['Subject'] = f"Résumé AutoBrief - {datetime.now().strftime('%d/%m/%Y')}"
+                subject = f"Résumé AutoBrief - {datetime.now().strftime('%d/%m/%Y')}"
             
             # Corps du message HTML
             # Si le summary contient déjà du HTML, l'utiliser directement
             if '<html>' in summary.lower() or '<body>' in summary.lower():
                 # Le summary est déjà en HTML, l'utiliser directement
-                message.attach(MIMEText(summary, 'html', 'utf-8'))
+                body = summary
             else:
                 # Sinon, créer un HTML basique
                 group_info = f" - {group_title}" if group_title else ""
@@ -1513,13 +1953,10 @@ class NewsletterManager:
                 </body>
                 </html>
                 """
-                message.attach(MIMEText(body, 'html', 'utf-8'))
-            
-            # Encoder le message
-            raw_message = {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
             
-            # Envoyer l'email
-            sent_message = service.users().messages().send(userId='me', body=raw_message).execute()
+            # Envoyer l'email (expéditeur du service de l'utilisateur, réutilisé entre les groupes)
+            if not self.auth.get_email_sender(service).send(notification_email, subject, body):
+                raise RuntimeError(f"échec de l'envoi Gmail à {notification_email}")
             
             if hasattr(st, 'success'):
                 st.success(f"Résumé envoyé par email à {notification_email}")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Classifieur local des emails promotionnels (sans appel réseau)
+
+Caractéristiques hachées (mots et bigrammes du sujet, expéditeur, List-Id, mots-clés
+promotionnels) et régression logistique entraînée avec NumPy sur un jeu de sujets
+étiquetés. Un lot de messages est évalué en un seul calcul vectorisé.
+
+Exécuté directement : validation croisée sur le jeu d'entraînement (comparée aux
+mots-clés seuls) et mesure des temps d'entraînement et de classement.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # NumPy absent : classification par mots-clés uniquement
+    np = None
+
+from keyword_matcher import PROMOTIONAL_MATCHER, fold_text
+
+# Jeu d'entraînement livré avec l'application (sujet, expéditeur, List-Id, étiquette)
+SEED_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'promo_seed_data.json')
+
+# Nombre de colonnes du vecteur de caractéristiques (hachage)
+N_FEATURES = 2 ** 12
+
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)?")
+ADDRESS_PATTERN = re.compile(r'<?([^<>\s@]+)@([^<>\s]+?)>?\s*$')
+PRICE_PATTERN = re.compile(r'\d+\s*(?:%|€|\$|£|eur\b)|[€$£]\s*\d+')
+
+_default_classifier = None
+_default_classifier_lock = threading.Lock()
+
+
+def message_fields(message):
+    """Sujet, expéditeur et List-Id d'un message Gmail (format metadata ou full)"""
+    fields = {'subject': '', 'from': '', 'list_id': ''}
+    names = {'subject': 'subject', 'from': 'from', 'list-id': 'list_id'}
+    for header in message.get('payload', {}).get('headers', []):
+        key = names.get(header.get('name', '').lower())
+        if key and not fields[key]:
+            fields[key] = header.get('value', '')
+    return fields
+
+
+def extract_features(fields):
+    """Caractéristiques (chaînes) d'un message décrit par ses champs subject / from / list_id"""
+    subject = fields.get('subject', '')
+    words = WORD_PATTERN.findall(fold_text(subject))
+    features = ['w:' + word for word in words]
+    features += ['b:' + first + '_' + second for first, second in zip(words, words[1:])]
+    features += ['kw:' + keyword for keyword in PROMOTIONAL_MATCHER.find_all(subject)]
+
+    if PRICE_PATTERN.search(subject):
+        features.append('sig:price')
+    if '!' in subject:
+        features.append('sig:exclamation')
+    if any(ord(char) > 0x2000 and not char.isalnum() for char in subject):
+        features.append('sig:symbol')
+
+    address = ADDRESS_PATTERN.search(fields.get('from', ''))
+    if address:
+        local_part, domain = fold_text(address.group(1)), fold_text(address.group(2))
+        features.append('from:' + local_part)
+        features += ['fd:' + part for part in domain.split('.')[:-1]]
+
+    list_id = fold_text(fields.get('list_id', '')).strip('<> ')
+    if list_id:
+        features.append('list')
+        features += ['ld:' + part for part in list_id.split('.')[:-1]]
+    else:
+        features.append('nolist')
+    return features
+
+
+def _feature_index(feature, n_features):
+    # crc32 : indices stables d'un processus à l'autre (contrairement à hash())
+    return zlib.crc32(feature.encode('utf-8')) % n_features
+
+
+def hashed_indices(fields_list, n_features=N_FEATURES):
+    """Coordonnées (ligne, colonne) des caractéristiques hachées de chaque message, sans doublon"""
+    rows, columns = [], []
+    for row, fields in enumerate(fields_list):
+        indices = {_feature_index(feature, n_features) for feature in extract_features(fields)}
+        rows.extend([row] * len(indices))
+        columns.extend(indices)
+    return np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)
+
+
+def vectorize(fields_list, n_features=N_FEATURES):
+    """Matrice dense (messages x n_features) des caractéristiques hachées, lignes normalisées (L2)"""
+    rows, columns = hashed_indices(fields_list, n_features)
+    matrix = np.zeros((len(fields_list), n_features), dtype=np.float32)
+    matrix[rows, columns] = 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-6)
+
+
+def _sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -30, 30)))
+
+
+class PromoClassifier:
+    """Régression logistique (descente de gradient, régularisation L2) sur caractéristiques hachées"""
+
+    def __init__(self, n_features=N_FEATURES, l2=1e-4, learning_rate=4.0, epochs=400, threshold=0.5):
+        self.n_features = n_features
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.threshold = threshold
+        self.weights = None
+        self.bias = 0.0
+
+    def fit(self, fields_list, labels):
+        """Entraîne le modèle sur des champs de messages et leurs étiquettes (True = promotionnel)"""
+        features = vectorize(fields_list, self.n_features)
+        targets = np.asarray(labels, dtype=np.float32)
+        self.weights = np.zeros(self.n_features, dtype=np.float32)
+        self.bias = 0.0
+        for _ in range(self.epochs):
+            errors = _sigmoid(features @ self.weights + self.bias) - targets
+            self.weights -= self.learning_rate * (features.T @ errors / len(targets) + self.l2 * self.weights)
+            self.bias -= self.learning_rate * float(errors.mean())
+        return self
+
+    def predict_proba(self, fields_list):
+        """Probabilité que chaque message soit promotionnel (calcul vectorisé pour tout le lot)"""
+        if not fields_list:
+            return np.zeros(0, dtype=np.float32)
+        # Produit creux : somme des poids des caractéristiques présentes, divisée par la norme de la ligne
+        rows, columns = hashed_indices(fields_list, self.n_features)
+        size = len(fields_list)
+        sums = np.bincount(rows, weights=self.weights[columns], minlength=size)
+        counts = np.bincount(rows, minlength=size)
+        return _sigmoid(sums / np.sqrt(np.maximum(counts, 1)) + self.bias)
+
+    def predict(self, fields_list):
+        """True pour chaque message classé promotionnel"""
+        return [bool(probability >= self.threshold) for probability in self.predict_proba(fields_list)]
+
+
+def load_training_data(path=SEED_DATA_PATH):
+    """Champs et étiquettes d'un fichier JSON [{subject, from, list_id, promotional}, ...]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        rows = json.load(f)
+    return [{key: row.get(key, '') for key in ('subject', 'from', 'list_id')} for row in rows], \
+        [bool(row['promotional']) for row in rows]
+
+
+def get_default_classifier(path=None, threshold=0.5):
+    """Classifieur entraîné une fois par processus sur le jeu fourni (None si NumPy est absent)"""
+    global _default_classifier
+    if np is None:
+        return None
+    with _default_classifier_lock:
+        if _default_classifier is None:
+            started = time.perf_counter()
+            fields_list, labels = load_training_data(path or SEED_DATA_PATH)
+            _default_classifier = PromoClassifier(threshold=threshold).fit(fields_list, labels)
+            print(f"🧠 DEBUG: Classifieur promotionnel entraîné sur {len(labels)} exemples en {time.perf_counter() - started:.2f}s")
+        return _default_classifier
+
+
+def _scores(predictions, labels):
+    true_positives = sum(1 for predicted, label in zip(predictions, labels) if predicted and label)
+    predicted_positives = sum(predictions)
+    positives = sum(labels)
+    accuracy = sum(1 for predicted, label in zip(predictions, labels) if predicted == label) / len(labels)
+    precision = true_positives / predicted_positives if predicted_positives else 0.0
+    recall = true_positives / positives if positives else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return accuracy, precision, recall, f1
+
+
+def evaluate(fields_list, labels, folds=5, seed=0):
+    """Validation croisée (k plis) : prédictions hors entraînement du classifieur et des mots-clés"""
+    order = np.random.default_rng(seed).permutation(len(labels))
+    predictions = [False] * len(labels)
+    for fold in range(folds):
+        test = order[fold::folds]
+        train = np.setdiff1d(order, test)
+        classifier = PromoClassifier().fit([fields_list[i] for i in train], [labels[i] for i in train])
+        for i, predicted in zip(test, classifier.predict([fields_list[i] for i in test])):
+            predictions[i] = predicted
+    keyword_predictions = [PROMOTIONAL_MATCHER.matches(fields['subject']) for fields in fields_list]
+    return _scores(predictions, labels), _scores(keyword_predictions, labels)
+
+
+def main():
+    """Rapport de précision (validation croisée) et mesure des performances"""
+    if np is None:
+        print("❌ NumPy est requis : pip install numpy")
+        sys.exit(1)
+
+    path = sys.argv[1] if len(sys.argv) > 1 else SEED_DATA_PATH
+    fields_list, labels = load_training_data(path)
+    print(f"📚 {len(labels)} exemples ({sum(labels)} promotionnels) - {path}")
+
+    model_scores, keyword_scores = evaluate(fields_list, labels)
+    print("📊 Validation croisée (5 plis)      exactitude  précision  rappel     F1")
+    for name, (accuracy, precision, recall, f1) in (('Classifieur', model_scores), ('Mots-clés seuls', keyword_scores)):
+        print(f"   {name:<32} {accuracy:9.1%} {precision:10.1%} {recall:7.1%} {f1:8.1%}")
+
+    started = time.perf_counter()
+    classifier = PromoClassifier().fit(fields_list, labels)
+    print(f"⏱️ Entraînement complet: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    for batch_size in (10, 100, 1000):
+        batch = [fields_list[i % len(fields_list)] for i in range(batch_size)]
+        runs = 20
+        started = time.perf_counter()
+        for _ in range(runs):
+            classifier.predict(batch)
+        elapsed = (time.perf_counter() - started) / runs
+        print(f"⏱️ Lot de {batch_size:>4} messages: {elapsed * 1000:7.2f} ms ({elapsed * 1e6 / batch_size:.0f} µs/message)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+# Statuts HTTP pour lesquels une nouvelle tentative a du sens
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Raisons Gmail renvoyées en 403 lorsque le quota par utilisateur est dépassé
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+class TokenBucket:
+    """Limiteur de débit à jetons, partagé entre threads (ex: unités de quota Gmail par seconde)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units=1):
+        """Bloque jusqu'à disposer de `units` jetons et retourne le temps d'attente (secondes)
+
+        Une demande plus grande que la capacité attend un seau plein puis laisse
+        une dette, remboursée avant les demandes suivantes.
+        """
+        waited = 0.0
+        needed = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= units
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def is_retryable_error(error):
+    """Indique si une erreur de l'API Google mérite une nouvelle tentative (429, 5xx, quota)"""
+    if not isinstance(error, HttpError):
+        return False
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        return any(reason in str(error) for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Délai avant la tentative suivante : backoff exponentiel avec jitter complet"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
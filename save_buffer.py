@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+
+class SaveBuffer:
+    """Tampon d'écriture différée : les sauvegardes rapprochées sont regroupées en un seul envoi
+
+    Chaque soumission remplace les données en attente ; l'envoi a lieu en arrière-plan
+    `delay` secondes après la première soumission non envoyée. save_function(data) est
+    appelée hors du thread Streamlit : elle ne doit pas utiliser st.* et signale un
+    échec en retournant False ou en levant une exception.
+    """
+
+    IDLE = 'idle'
+    PENDING = 'pending'
+    SAVING = 'saving'
+    SAVED = 'saved'
+    ERROR = 'error'
+
+    def __init__(self, save_function, delay):
+        self.save_function = save_function
+        self.delay = delay
+        self.status = self.IDLE
+        self.last_error = None
+        self.last_saved_at = None
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Un seul envoi à la fois
+
+    def submit(self, data):
+        """Met en attente une copie de data et programme l'envoi si aucun n'est prévu"""
+        # Copie : l'appelant peut continuer à modifier data (cache de session)
+        snapshot = json.loads(json.dumps(data))
+        with self._lock:
+            self._pending = snapshot
+            self.status = self.PENDING
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    @property
+    def busy(self):
+        """Vrai si des données attendent d'être envoyées ou sont en cours d'envoi"""
+        return self.status in (self.PENDING, self.SAVING)
+
+    def flush(self):
+        """Envoie immédiatement les données en attente (bloquant), retourne False en cas d'échec
+
+        En cas d'échec, les données restent en attente pour le prochain envoi.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                data, self._pending = self._pending, None
+                if data is None:
+                    return self.status != self.ERROR
+                self.status = self.SAVING
+
+            try:
+                success = bool(self.save_function(data))
+                error = None if success else "écriture refusée par le stockage"
+            except Exception as e:
+                success, error = False, str(e)
+
+            with self._lock:
+                if success:
+                    self.last_saved_at = time.time()
+                    self.last_error = None
+                    self.status = self.PENDING if self._pending is not None else self.SAVED
+                else:
+                    print(f"❌ DEBUG: Sauvegarde différée échouée: {error}")
+                    if self._pending is None:
+                        self._pending = data
+                    self.last_error = error
+                    self.status = self.ERROR
+            return success
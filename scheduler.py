@@ -8,6 +8,9 @@ import os
 import sys
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from email.mime.text import MIMEText
@@ -15,7 +18,7 @@ from email.mime.text import MIMEText
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s',
     handlers=[
         logging.FileHandler('scheduler_results.log'),
         logging.StreamHandler()
@@ -26,52 +29,77 @@ logging.basicConfig(
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
+from credential_manager import CredentialManager
 from newsletter_manager import NewsletterManager
+from rate_limiter import TokenBucket
+from user_data_store import create_user_data_store, UserDataStoreError
 
 class AutoBriefScheduler:
     def __init__(self):
         self.config = Config()
         self.data_dir = "user_data"
         self.logger = logging.getLogger(__name__)
+        self.last_run_report = []
+        self._rate_limiters = {}
+        self._rate_limiters_lock = threading.Lock()
+        self._gist_lock = threading.Lock()  # Snapshot du Gist et mises à jour en attente
+        self._user_data_store = None
+        self._gist_snapshot = None  # Données des utilisateurs, chargées une fois par exécution
+        self._pending_group_updates = {}  # (utilisateur, groupe) -> last_run / sync_state à envoyer
+        self._last_flush = time.monotonic()
+        self.credential_manager = None  # Tokens préparés avant le traitement des groupes
         
+    def get_user_data_store(self):
+        """Stockage des données utilisateur (Gist ou SQLite selon la configuration), créé une fois"""
+        if self._user_data_store is None:
+            self._user_data_store = create_user_data_store(self.config)
+        return self._user_data_store
+    
+    def fetch_gist_users_data(self, user_emails=None):
+        """Télécharge les données des utilisateurs depuis le Gist (None en cas d'erreur)"""
+        store = self.get_user_data_store()
+        if not store:
+            self.logger.info("Aucun stockage configuré (GIST_ID manquant dans les secrets GitHub)")
+            return None
+        
+        try:
+            return store.load_users(user_emails)
+        except UserDataStoreError as e:
+            self.logger.error(str(e))
+            return None
+    
+    def load_gist_snapshot(self, force=False):
+        """Charge une seule fois par exécution les données de tous les utilisateurs
+        
+        Toutes les étapes du scheduler lisent ce snapshot en mémoire ; les mises à
+        jour (last_run, sync_state) y sont accumulées puis envoyées par flush_gist_updates.
+        """
+        with self._gist_lock:
+            if self._gist_snapshot is None or force:
+                try:
+                    self._gist_snapshot = self.fetch_gist_users_data() or {}
+                except Exception as e:
+                    self.logger.error(f"Erreur lors du chargement des données utilisateur: {e}")
+                    self._gist_snapshot = {}
+            return self._gist_snapshot
+    
     def get_all_users(self):
         """Récupère tous les utilisateurs depuis GitHub Gist avec leurs groupes"""
         users = []
         
         try:
-            # Charger les données depuis GitHub Gist
-            gist_id = os.getenv('GIST_ID')
-            
-            if not gist_id:
-                self.logger.info("Aucun GIST_ID trouvé dans les secrets GitHub")
-                return users
-            
-            import requests
-            headers = {'Accept': 'application/vnd.github.v3+json'}
-            gist_token = os.getenv('GIST_TOKEN')
-            if gist_token:
-                headers['Authorization'] = f'token {gist_token}'
-            
-            response = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers)
-            
-            if response.status_code == 200:
-                gist_data = response.json()
-                if 'user_data.json' in gist_data['files']:
-                    content = gist_data['files']['user_data.json']['content']
-                    all_users_data = json.loads(content)
-                    
-                    for user_email, user_data in all_users_data.items():
-                        newsletter_groups = user_data.get('newsletter_groups', [])
-                        
-                        # Vérifier si l'utilisateur a des groupes actifs
-                        if newsletter_groups:
-                            users.append({
-                                'email': user_email,
-                                'newsletter_groups': newsletter_groups,
-                                'oauth_credentials': user_data.get('oauth_credentials', {})
-                            })
-            else:
-                self.logger.error(f"Erreur lors de la récupération du Gist: {response.status_code}")
+            all_users_data = self.load_gist_snapshot()
+            
+            for user_email, user_data in all_users_data.items():
+                newsletter_groups = user_data.get('newsletter_groups', [])
+                
+                # Vérifier si l'utilisateur a des groupes actifs
+                if newsletter_groups:
+                    users.append({
+                        'email': user_email,
+                        'newsletter_groups': newsletter_groups,
+                        'oauth_credentials': user_data.get('oauth_credentials', {})
+                    })
                     
         except Exception as e:
             self.logger.error(f"Erreur lors du chargement des données utilisateur: {e}")
@@ -217,130 +245,92 @@ class AutoBriefScheduler:
             self.logger.error(f"Erreur vérification horaire: {e}")
             return True  # En cas d'erreur, on autorise l'exécution
     
-    def send_email(self, to_email, subject, content):
-        """Envoie un email via le script d'envoi"""
-        try:
-            import subprocess
-            
-            # Définir les variables d'environnement pour le script
-            # Sauvegarder le contenu dans un fichier temporaire
-            temp_content_file = 'temp_email_content.html'
-            with open(temp_content_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            # Préparer les variables d'environnement pour le script
-            env = os.environ.copy()
-            env['TO_EMAIL'] = to_email
-            env['SUBJECT'] = subject
-            env['CONTENT_FILE'] = temp_content_file
-            
-            self.logger.info(f"Envoi email pour {to_email}")
-            self.logger.info(f"Sujet: {subject}")
-            
-            # Exécuter le script d'envoi d'email final
-            result = subprocess.run(
-                ['python', 'send_email_final.py'],
-                env=env,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+    def get_due_groups(self, user_info):
+        """Retourne les groupes de l'utilisateur à traiter maintenant"""
+        due_groups = []
+        for group in user_info.get('newsletter_groups', []):
+            group_title = group.get('title', 'Sans titre')
             
-            # Afficher les logs
-            if result.stdout:
-                for line in result.stdout.strip().split('\n'):
-                    self.logger.info(f"📧 {line}")
+            # Vérifier si ce groupe doit être traité
+            if not self.should_group_run_automatically(group.get('settings', {})):
+                self.logger.info(f"⏳ Groupe '{group_title}' pas encore prêt")
+                continue
             
-            if result.stderr:
-                for line in result.stderr.strip().split('\n'):
-                    self.logger.error(f"❌ {line}")
+            if not group.get('emails', []):
+                self.logger.warning(f"⚠️ Aucun email dans le groupe '{group_title}'")
+                continue
             
-            if result.returncode == 0:
-                self.logger.info(f"✅ Email envoyé avec succès à {to_email}")
-                return True
-            else:
-                self.logger.error(f"❌ Échec envoi email (code: {result.returncode})")
-                return False
-            
-        except subprocess.TimeoutExpired:
-            self.logger.error("❌ Timeout lors de l'envoi d'email")
-            return False
-        except Exception as e:
-            self.logger.error(f"❌ Erreur envoi email: {e}")
-            return False
+            due_groups.append(group)
+        return due_groups
     
-    def process_user_groups(self, user_info):
-        """Traite les groupes de newsletters pour un utilisateur"""
-        try:
-            self.logger.info(f"🔄 Traitement des groupes pour {user_info['email']}")
-            
-            newsletter_groups = user_info.get('newsletter_groups', [])
-            if not newsletter_groups:
-                self.logger.warning(f"⚠️ Aucun groupe de newsletters pour {user_info['email']}")
-                return False
-            
-            processed_groups = 0
-            
-            # Traiter chaque groupe individuellement
-            for group in newsletter_groups:
-                group_title = group.get('title', 'Sans titre')
-                group_settings = group.get('settings', {})
-                group_emails = group.get('emails', [])
-                
-                # Vérifier si ce groupe doit être traité
-                if not self.should_group_run_automatically(group_settings):
-                    self.logger.info(f"⏳ Groupe '{group_title}' pas encore prêt")
-                    continue
-                
-                if not group_emails:
-                    self.logger.warning(f"⚠️ Aucun email dans le groupe '{group_title}'")
-                    continue
-                
-                self.logger.info(f"📧 Traitement du groupe '{group_title}' avec {len(group_emails)} emails")
-                
-                # Traiter ce groupe spécifique
-                if self.process_single_group(user_info, group):
-                    processed_groups += 1
-                    self.logger.info(f"✅ Groupe '{group_title}' traité avec succès")
-                else:
-                    self.logger.error(f"❌ Échec traitement du groupe '{group_title}'")
-            
-            return processed_groups > 0
-            
-        except Exception as e:
-            self.logger.error(f"❌ Erreur traitement groupes {user_info['email']}: {e}")
-            return False
+    def run_jobs(self, jobs):
+        """Traite les couples (utilisateur, groupe) en parallèle et retourne le rapport d'exécution"""
+        if not jobs:
+            return []
+        
+        max_workers = max(1, min(self.config.SCHEDULER_MAX_WORKERS, len(jobs)))
+        self.logger.info(f"⚙️ {len(jobs)} groupes à traiter ({max_workers} en parallèle)")
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='autobrief') as executor:
+            return list(executor.map(lambda job: self.run_job(*job), jobs))
+    
+    def run_job(self, user_info, group):
+        """Traite un groupe et mesure sa durée (entrée du rapport d'exécution)"""
+        group_title = group.get('title', 'Sans titre')
+        self.logger.info(f"📧 Traitement du groupe '{group_title}' de {user_info['email']} avec {len(group.get('emails', []))} emails")
+        
+        started = time.monotonic()
+        success = self.process_single_group(user_info, group)
+        duration = time.monotonic() - started
+        
+        if success:
+            self.logger.info(f"✅ Groupe '{group_title}' de {user_info['email']} traité avec succès en {duration:.1f}s")
+        else:
+            self.logger.error(f"❌ Échec traitement du groupe '{group_title}' de {user_info['email']} ({duration:.1f}s)")
+        
+        return {
+            'user_email': user_info['email'],
+            'group_title': group_title,
+            'success': success,
+            'duration': duration
+        }
+    
+    def get_user_rate_limiter(self, user_email):
+        """Limiteur de quota Gmail partagé par tous les groupes d'un même utilisateur"""
+        with self._rate_limiters_lock:
+            if user_email not in self._rate_limiters:
+                self._rate_limiters[user_email] = TokenBucket(self.config.GMAIL_QUOTA_UNITS_PER_SECOND)
+            return self._rate_limiters[user_email]
     
     def process_single_group(self, user_info, group):
-        """Traite un groupe spécifique"""
+        """Traite un groupe spécifique
+        
+        Chaque appel utilise ses propres NewsletterManager et SecureAuth, isolés de
+        st.session_state : plusieurs groupes peuvent être traités en parallèle.
+        """
+        group_title = group.get('title', 'Sans titre')
         try:
-            group_title = group.get('title', 'Sans titre')
             group_settings = group.get('settings', {})
-            group_emails = group.get('emails', [])
-            
-            # Simuler une session utilisateur pour NewsletterManager
-            import streamlit as st
-            st.session_state['user_email'] = user_info['email']
-            st.session_state['authenticated'] = True
-            
-            from newsletter_manager import NewsletterManager
-            newsletter_manager = NewsletterManager()
-            
-            # Forcer l'email utilisateur dans le NewsletterManager
-            newsletter_manager.user_email = user_info['email']
             
-            # Désactiver la sauvegarde dans le scheduler
-            newsletter_manager._scheduler_mode = True
+            # Instance dédiée à cet utilisateur (sans session Streamlit ni sauvegarde dans le Gist)
+            newsletter_manager = NewsletterManager(
+                user_email=user_info['email'],
+                user_data={'newsletter_groups': user_info.get('newsletter_groups', [])}
+            )
+            newsletter_manager.rate_limiter = self.get_user_rate_limiter(user_info['email'])
             
             # Configurer l'accès Gmail pour le NewsletterManager
             try:
                 from secure_auth import SecureAuth
                 auth = SecureAuth()
                 
-                # Récupérer les credentials de l'utilisateur depuis le Gist
-                user_credentials = self.get_user_credentials_from_gist(user_info['email'])
+                # Credentials préparées (token rafraîchi) ou, à défaut, lues depuis le Gist
+                user_credentials = None
+                if self.credential_manager:
+                    user_credentials = self.credential_manager.credentials.get(user_info['email'])
+                if not user_credentials:
+                    user_credentials = self.get_user_credentials_from_gist(user_info['email'])
                 if user_credentials:
-                    import json
                     credentials_json = json.dumps(user_credentials)
                     auth.set_external_credentials(credentials_json)
                 else:
@@ -352,13 +342,14 @@ class AutoBriefScheduler:
                 self.logger.error(f"❌ Erreur configuration Gmail auth: {e}")
                 return False
             
-            # Traiter ce groupe spécifique
-            result = newsletter_manager.process_single_group(group_title, group_settings)
+            # Traiter ce groupe spécifique (seulement les nouveaux messages depuis le dernier run)
+            result = newsletter_manager.process_single_group(group_title, group_settings, incremental=True)
             
             # Vérifier si un résumé a vraiment été généré et envoyé
             if result and isinstance(result, str) and result.strip():
                 # Mettre à jour la date de dernière exécution seulement si un email a été envoyé
-                self.update_group_last_run(user_info['email'], group_title)
+                sync_state = newsletter_manager.pending_sync_states.get(group_title)
+                self.update_group_last_run(user_info['email'], group_title, sync_state)
                 self.logger.info(f"📄 Résumé généré et email envoyé pour le groupe '{group_title}'")
                 return True
             elif result is True:
@@ -377,193 +368,261 @@ class AutoBriefScheduler:
     
     
     def get_user_credentials_from_gist(self, user_email):
-        """Récupère les credentials OAuth2 de l'utilisateur depuis le Gist"""
+        """Récupère les credentials OAuth2 de l'utilisateur depuis le snapshot du Gist"""
         try:
-            import requests
-            import json
-            
-            gist_id = os.getenv('GIST_ID')
-            gist_token = os.getenv('GIST_TOKEN')
+            all_users_data = self.load_gist_snapshot()
             
+            # Récupérer les données de l'utilisateur
+            if user_email not in all_users_data:
+                self.logger.warning(f"⚠️ Utilisateur {user_email} non trouvé dans le Gist")
+                return None
             
-            if not gist_id or not gist_token:
-                self.logger.error("❌ GIST_ID ou GIST_TOKEN manquant")
+            user_data = all_users_data[user_email]
+            # Vérifier si l'utilisateur a des credentials OAuth2 stockés
+            if 'oauth_credentials' not in user_data:
+                self.logger.warning(f"⚠️ Aucun token OAuth2 stocké pour {user_email}")
                 return None
             
-            # Récupérer le Gist
-            headers = {
-                'Authorization': f'token {gist_token}',
-                'Accept': 'application/vnd.github.v3+json'
-            }
+            oauth_creds = user_data['oauth_credentials']
             
-            response = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers)
+            # Vérifier si les données sont chiffrées
+            if not (oauth_creds.get('_encrypted', False) and '_encrypted_data' in oauth_creds):
+                # Ancien format non chiffré (pour compatibilité)
+                return oauth_creds
             
-            if response.status_code == 200:
-                gist_data = response.json()
-                if 'user_data.json' in gist_data['files']:
-                    content = gist_data['files']['user_data.json']['content']
-                    all_users_data = json.loads(content) if content else {}
-                    
-                    # Récupérer les données de l'utilisateur
-                    if user_email in all_users_data:
-                        user_data = all_users_data[user_email]
-                        # Vérifier si l'utilisateur a des credentials OAuth2 stockés
-                        if 'oauth_credentials' in user_data:
-                            oauth_creds = user_data['oauth_credentials']
-                            
-                            # Vérifier si les données sont chiffrées
-                            if oauth_creds.get('_encrypted', False) and '_encrypted_data' in oauth_creds:
-                                # Les données sont chiffrées, on peut les déchiffrer avec SECRET_KEY
-                                try:
-                                    from cryptography.fernet import Fernet
-                                    import base64
-                                    import json
-                                    
-                                    # Récupérer SECRET_KEY depuis les variables d'environnement
-                                    secret_key = os.getenv('SECRET_KEY')
-                                    if not secret_key:
-                                        self.logger.error("❌ SECRET_KEY manquante pour déchiffrer les credentials")
-                                        return None
-                                    
-                                    
-                                    # Générer la clé Fernet (même méthode que dans config.py)
-                                    key = base64.urlsafe_b64encode(secret_key.encode()[:32].ljust(32, b'0'))
-                                    fernet = Fernet(key)
-                                    
-                                    # Déchiffrer les credentials
-                                    encrypted_data = oauth_creds['_encrypted_data']
-                                    
-                                    # Essayer de déchiffrer avec différentes méthodes
-                                    try:
-                                        # Méthode 1: Direct
-                                        decrypted_data = fernet.decrypt(encrypted_data.encode())
-                                    except Exception:
-                                        # Méthode 2: Avec données pré-décodées
-                                        try:
-                                            import base64
-                                            decoded_data = base64.b64decode(encrypted_data)
-                                            decrypted_data = fernet.decrypt(decoded_data)
-                                        except Exception:
-                                            return None
-                                    
-                                    decrypted_creds = json.loads(decrypted_data.decode())
-                                    
-                                    return decrypted_creds
-                                    
-                                except Exception as e:
-                                    self.logger.error(f"❌ Erreur déchiffrement credentials pour {user_email}: {e}")
-                                    self.logger.error(f"❌ Type d'erreur: {type(e).__name__}")
-                                    self.logger.error(f"❌ Message détaillé: {str(e)}")
-                                    return None
-                            else:
-                                # Ancien format non chiffré (pour compatibilité)
-                                return oauth_creds
-                        else:
-                            self.logger.warning(f"⚠️ Aucun token OAuth2 stocké pour {user_email}")
-                            return None
-                    else:
-                        self.logger.warning(f"⚠️ Utilisateur {user_email} non trouvé dans le Gist")
-                        return None
-                else:
-                    self.logger.error("❌ Fichier user_data.json non trouvé dans le Gist")
+            # Les données sont chiffrées, on peut les déchiffrer avec SECRET_KEY
+            try:
+                from cryptography.fernet import Fernet
+                import base64
+                
+                # Récupérer SECRET_KEY depuis les variables d'environnement
+                secret_key = os.getenv('SECRET_KEY')
+                if not secret_key:
+                    self.logger.error("❌ SECRET_KEY manquante pour déchiffrer les credentials")
                     return None
-            else:
-                self.logger.error(f"❌ Erreur accès Gist: {response.status_code}")
+                
+                # Générer la clé Fernet (même méthode que dans config.py)
+                key = base64.urlsafe_b64encode(secret_key.encode()[:32].ljust(32, b'0'))
+                fernet = Fernet(key)
+                
+                # Déchiffrer les credentials
+                encrypted_data = oauth_creds['_encrypted_data']
+                
+                # Essayer de déchiffrer avec différentes méthodes
+                try:
+                    # Méthode 1: Direct
+                    decrypted_data = fernet.decrypt(encrypted_data.encode())
+                except Exception:
+                    # Méthode 2: Avec données pré-décodées
+                    try:
+                        decoded_data = base64.b64decode(encrypted_data)
+                        decrypted_data = fernet.decrypt(decoded_data)
+                    except Exception:
+                        return None
+                
+                return json.loads(decrypted_data.decode())
+                
+            except Exception as e:
+                self.logger.error(f"❌ Erreur déchiffrement credentials pour {user_email}: {e}")
+                self.logger.error(f"❌ Type d'erreur: {type(e).__name__}")
+                self.logger.error(f"❌ Message détaillé: {str(e)}")
                 return None
                 
         except Exception as e:
             self.logger.error(f"❌ Erreur récupération credentials utilisateur: {e}")
             return None
     
-    def update_group_last_run(self, user_email, group_title):
-        """Met à jour la date de dernière exécution pour un groupe spécifique"""
+    def prepare_credentials(self, jobs):
+        """Rafraîchit en parallèle les tokens des utilisateurs à traiter, avant tout appel Gmail
+        
+        Les tokens renouvelés sont sauvegardés en une seule écriture. Retourne les jobs
+        conservés et les entrées du rapport des groupes écartés (token inutilisable).
+        """
+        user_emails = sorted({user_info['email'] for user_info, _ in jobs})
+        if not user_emails:
+            return jobs, []
+        
+        started = time.monotonic()
+        manager = CredentialManager(self.config.SCHEDULER_MAX_WORKERS, self.config.CREDENTIAL_REFRESH_MARGIN)
+        manager.prepare({user_email: self.get_user_credentials_from_gist(user_email) for user_email in user_emails})
+        self.credential_manager = manager
+        self.logger.info(
+            f"🔑 Tokens prêts pour {len(manager.credentials)}/{len(user_emails)} utilisateurs "
+            f"({len(manager.refreshed)} rafraîchis en {time.monotonic() - started:.1f}s)"
+        )
+        
+        for user_email, reason in manager.failed.items():
+            self.logger.error(f"❌ Token OAuth2 inutilisable pour {user_email}, groupes ignorés: {reason}")
+        
+        if manager.refreshed:
+            self.save_refreshed_credentials(manager)
+        
+        kept_jobs = []
+        skipped = []
+        for user_info, group in jobs:
+            if user_info['email'] in manager.credentials:
+                kept_jobs.append((user_info, group))
+            else:
+                skipped.append({
+                    'user_email': user_info['email'],
+                    'group_title': group.get('title', 'Sans titre'),
+                    'success': False,
+                    'duration': 0.0
+                })
+        return kept_jobs, skipped
+    
+    def save_refreshed_credentials(self, manager):
+        """Sauvegarde (chiffrés) les tokens renouvelés, en une seule écriture"""
+        store = self.get_user_data_store()
+        if not store:
+            return False
+        
         try:
-            gist_id = os.getenv('GIST_ID')
-            
-            if not gist_id:
-                self.logger.error("GIST_ID non trouvé dans les variables d'environnement")
-                return
-            
-            import requests
+            from secure_auth import SecureAuth
+            auth = SecureAuth()
+            written = {}
             
-            # Charger les données actuelles du Gist
-            headers = {'Accept': 'application/vnd.github.v3+json'}
-            gist_token = os.getenv('GIST_TOKEN')
-            if gist_token:
-                headers['Authorization'] = f'token {gist_token}'
-            
-            response = requests.get(f'https://api.github.com/gists/{gist_id}', headers=headers)
+            def set_credentials(user_email, user_data):
+                if user_data is None:
+                    return None
+                credentials_info = manager.credentials[user_email]
+                encrypted_credentials = auth.encrypt_token(credentials_info)
+                if not encrypted_credentials:
+                    return None
+                user_data['oauth_credentials'] = dict(
+                    user_data.get('oauth_credentials') or {},
+                    _encrypted_data=encrypted_credentials,
+                    _encrypted=True
+                )
+                written[user_email] = user_data
+                return user_data
+            
+            store.update_users(sorted(manager.refreshed), set_credentials)
+            with self._gist_lock:
+                if self._gist_snapshot is not None:
+                    self._gist_snapshot.update(written)
+            self.logger.info(f"✅ Tokens rafraîchis sauvegardés pour {len(written)} utilisateurs")
+            return True
             
-            if response.status_code == 200:
-                gist_data = response.json()
-                if 'user_data.json' in gist_data['files']:
-                    content = gist_data['files']['user_data.json']['content']
-                    all_users_data = json.loads(content)
-                    
-                    # Mettre à jour la date pour ce groupe spécifique
-                    if user_email in all_users_data:
-                        user_data = all_users_data[user_email]
-                        newsletter_groups = user_data.get('newsletter_groups', [])
-                        
-                        for group in newsletter_groups:
-                            if group.get('title') == group_title:
-                                group['settings']['last_run'] = datetime.now().isoformat()
-                                break
-                        
-                        # Mettre à jour le Gist
-                        update_data = {
-                            "files": {
-                                "user_data.json": {
-                                    "content": json.dumps(all_users_data, indent=2, ensure_ascii=False)
-                                }
-                            }
-                        }
-                        
-                        # Headers avec authentification
-                        headers = {'Accept': 'application/vnd.github.v3+json'}
-                        gist_token = os.getenv('GIST_TOKEN')
-                        if gist_token:
-                            headers['Authorization'] = f'token {gist_token}'
-                        
-                        update_response = requests.patch(
-                            f'https://api.github.com/gists/{gist_id}',
-                            json=update_data,
-                            headers=headers
-                        )
-                        
-                        if update_response.status_code == 200:
-                            self.logger.info(f"✅ Date de dernière exécution mise à jour pour le groupe '{group_title}' de {user_email}")
-                        else:
-                            self.logger.error(f"❌ Erreur lors de la mise à jour du Gist: {update_response.status_code}")
-                    else:
-                        self.logger.warning(f"⚠️ Utilisateur {user_email} non trouvé dans les données")
-                else:
-                    self.logger.error("Fichier user_data.json non trouvé dans le Gist")
-            else:
-                self.logger.error(f"❌ Erreur lors de la récupération du Gist: {response.status_code}")
+        except Exception as e:
+            # Non bloquant : les tokens rafraîchis restent utilisables pour cette exécution
+            self.logger.error(f"❌ Erreur sauvegarde des tokens rafraîchis: {e}")
+            return False
+    
+    def update_group_last_run(self, user_email, group_title, sync_state=None):
+        """Met à jour la date de dernière exécution (et l'état de synchronisation Gmail) pour un groupe spécifique
+        
+        La mise à jour est appliquée au snapshot en mémoire et mise en attente ;
+        elle est envoyée au Gist par flush_gist_updates.
+        """
+        last_run = datetime.now().isoformat()
+        with self._gist_lock:
+            self._pending_group_updates[(user_email, group_title)] = {'last_run': last_run, 'sync_state': sync_state}
+            if self._gist_snapshot is not None and not self._apply_group_update(self._gist_snapshot, user_email, group_title, last_run, sync_state):
+                self.logger.warning(f"⚠️ Groupe '{group_title}' de {user_email} non trouvé dans les données")
+        self.logger.info(f"🕒 Date de dernière exécution en attente d'envoi pour le groupe '{group_title}' de {user_email}")
+        
+        # Envoi périodique : limite la perte en cas d'interruption de l'exécution
+        if time.monotonic() - self._last_flush >= self.config.SCHEDULER_FLUSH_INTERVAL:
+            self.flush_gist_updates()
+    
+    def _apply_group_update(self, all_users_data, user_email, group_title, last_run, sync_state=None):
+        """Applique une mise à jour de groupe aux données ; False si le groupe est introuvable"""
+        for group in all_users_data.get(user_email, {}).get('newsletter_groups', []):
+            if group.get('title') == group_title:
+                group.setdefault('settings', {})['last_run'] = last_run
+                if sync_state:
+                    group['sync_state'] = sync_state
+                return True
+        return False
+    
+    def flush_gist_updates(self):
+        """Envoie en un seul PATCH les mises à jour accumulées depuis le dernier envoi
+        
+        Les mises à jour sont réappliquées sur la dernière version des fichiers des
+        utilisateurs concernés (et de nouveau en cas d'écriture concurrente) pour ne
+        pas écraser les modifications faites dans l'application pendant l'exécution.
+        """
+        with self._gist_lock:
+            self._last_flush = time.monotonic()
+            pending_updates, self._pending_group_updates = self._pending_group_updates, {}
+        if not pending_updates:
+            return True
+        
+        store = self.get_user_data_store()
+        if not store:
+            self.logger.error("Aucun stockage configuré (GIST_ID manquant)")
+            return False
+        
+        written = {}
+        
+        def apply_updates(user_email, user_data):
+            if user_data is None:
+                return None
+            for (update_email, group_title), update in pending_updates.items():
+                if update_email == user_email and not self._apply_group_update(
+                    {user_email: user_data}, user_email, group_title, update['last_run'], update['sync_state']
+                ):
+                    self.logger.warning(f"⚠️ Groupe '{group_title}' de {user_email} non trouvé dans le Gist")
+            written[user_email] = user_data
+            return user_data
+        
+        try:
+            # Écriture optimiste : les autres écrivains ne sont pas bloqués
+            store.update_users(sorted({user_email for user_email, _ in pending_updates}), apply_updates)
+            self.logger.info(f"✅ Dates de dernière exécution mises à jour pour {len(pending_updates)} groupes")
+            with self._gist_lock:
+                if self._gist_snapshot is not None:
+                    self._gist_snapshot.update(written)
+            return True
             
         except Exception as e:
             self.logger.error(f"❌ Erreur mise à jour: {e}")
+            # Remettre en attente les mises à jour non envoyées (sans écraser les plus récentes)
+            with self._gist_lock:
+                for key, update in pending_updates.items():
+                    self._pending_group_updates.setdefault(key, update)
+            return False
     
     def run_scheduler(self):
         """Fonction principale du scheduler"""
         self.logger.info(f"🚀 Démarrage du scheduler AutoBrief - {datetime.now()}")
+        started = time.monotonic()
         
         users = self.get_all_users()
         self.logger.info(f"👥 {len(users)} utilisateurs avec des groupes de newsletters")
         
-        processed = 0
+        jobs = []
         for user_info in users:
             self.logger.info(f"🔄 Vérification des groupes pour {user_info['email']}")
-            
-            if self.process_user_groups(user_info):
-                processed += 1
-                self.logger.info(f"✅ Traitement réussi pour {user_info['email']}")
-            else:
+            due_groups = self.get_due_groups(user_info)
+            if not due_groups:
                 self.logger.info(f"ℹ️ Aucun groupe à traiter pour {user_info['email']}")
+            jobs.extend((user_info, group) for group in due_groups)
+        
+        # Tokens rafraîchis en amont : pas de rafraîchissement pendant le traitement des groupes
+        jobs, skipped = self.prepare_credentials(jobs)
         
+        try:
+            self.last_run_report = skipped + self.run_jobs(jobs)
+        finally:
+            # Un seul PATCH du Gist pour toutes les mises à jour restantes
+            self.flush_gist_updates()
+        self.log_run_report(self.last_run_report, time.monotonic() - started)
+        
+        processed = len({entry['user_email'] for entry in self.last_run_report if entry['success']})
         self.logger.info(f"🎯 Scheduler terminé - {processed} utilisateurs traités")
         return processed
+    
+    def log_run_report(self, report, wall_time):
+        """Journalise le rapport d'exécution : statut et durée de chaque groupe"""
+        self.logger.info(f"📊 Rapport d'exécution - {len(report)} groupes en {wall_time:.1f}s")
+        for entry in sorted(report, key=lambda entry: entry['duration'], reverse=True):
+            status = "✅" if entry['success'] else "❌"
+            self.logger.info(f"   {status} {entry['duration']:6.1f}s  {entry['user_email']} / {entry['group_title']}")
+        if report:
+            total = sum(entry['duration'] for entry in report)
+            self.logger.info(f"   Somme des durées: {total:.1f}s (gain du parallélisme: x{total / max(wall_time, 0.001):.1f})")
 
 def main():
     """Point d'entrée principal"""
@@ -1,20 +1,53 @@
 import streamlit as st
 import os
 import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from config import Config
 import base64
 from cryptography.fernet import Fernet
 
+# Services Gmail déjà construits, par utilisateur (client OAuth, refresh token) :
+# {'service', 'credentials', 'email', 'lock'}, du moins au plus récemment utilisé
+_gmail_services = OrderedDict()
+_gmail_services_lock = threading.Lock()
+
+
+def build_gmail_service(credentials):
+    """Construit le service Gmail sans appel réseau (document de découverte embarqué)
+
+    Chaque thread utilise son propre client HTTP authentifié (httplib2 n'est pas
+    thread-safe) : le service peut être partagé entre threads.
+    """
+    local = threading.local()
+
+    def thread_http():
+        if not hasattr(local, 'http'):
+            local.http = AuthorizedHttp(credentials, http=httplib2.Http())
+        return local.http
+
+    def request_builder(http, *args, **kwargs):
+        return HttpRequest(thread_http(), *args, **kwargs)
+
+    return build('gmail', 'v1', http=thread_http(), requestBuilder=request_builder,
+                 static_discovery=True, cache_discovery=False)
+
+
 class SecureAuth:
     def __init__(self):
         self.config = Config()
         self.encryption = self.config.get_encryption_key()
         self.external_credentials = None  # Pour les credentials externes (GitHub Actions)
+        self._service_entry = None  # Entrée du cache de services Gmail utilisée par cette instance
         
     
     def get_credentials_file(self):
@@ -88,14 +121,15 @@ class SecureAuth:
             try:
                 credentials_data = json.loads(self.external_credentials)
                 
-                # Créer l'objet Credentials
+                # Créer l'objet Credentials (avec l'expiration connue : pas de rafraîchissement inutile)
                 credentials = Credentials(
                     token=credentials_data['token'],
                     refresh_token=credentials_data['refresh_token'],
                     token_uri=credentials_data.get('token_uri', 'https://oauth2.googleapis.com/token'),
                     client_id=credentials_data['client_id'],
                     client_secret=credentials_data['client_secret'],
-                    scopes=credentials_data.get('scopes', self.config.SCOPES)
+                    scopes=credentials_data.get('scopes', self.config.SCOPES),
+                    expiry=datetime.fromisoformat(credentials_data['expiry']) if credentials_data.get('expiry') else None
                 )
                 
                 return credentials
@@ -225,34 +259,102 @@ class SecureAuth:
                 
         return False
     
+    def get_service_entry(self, credentials):
+        """Service Gmail de cet utilisateur, construit une seule fois par processus
+        
+        Le token est rafraîchi si nécessaire ; les credentials de l'entrée peuvent donc
+        être plus récentes que celles fournies.
+        """
+        key = (credentials.client_id, credentials.refresh_token or credentials.token)
+        with _gmail_services_lock:
+            entry = _gmail_services.get(key)
+            if entry is None:
+                entry = {
+                    'service': build_gmail_service(credentials),
+                    'credentials': credentials,
+                    'email': None,
+                    'lock': threading.Lock()
+                }
+                _gmail_services[key] = entry
+                while len(_gmail_services) > self.config.GMAIL_SERVICE_CACHE_SIZE:
+                    _gmail_services.popitem(last=False)
+            else:
+                _gmail_services.move_to_end(key)
+        
+        with entry['lock']:
+            if entry['credentials'].expired and entry['credentials'].refresh_token:
+                entry['credentials'].refresh(Request())
+        return entry
+    
+    def _read_profile_email(self, entry):
+        """Adresse Gmail d'une entrée du cache (getProfile au premier appel, None si absente)
+        
+        Les erreurs de l'API sont propagées.
+        """
+        if entry['email'] is None:
+            profile = entry['service'].users().getProfile(userId='me').execute()
+            entry['email'] = profile.get('emailAddress')
+        return entry['email']
+    
     def get_user_email(self, credentials):
-        """Récupère l'email de l'utilisateur connecté"""
+        """Récupère l'email de l'utilisateur connecté (texte de remplacement pour l'interface)"""
         try:
-            service = build('gmail', 'v1', credentials=credentials)
-            profile = service.users().getProfile(userId='me').execute()
-            return profile.get('emailAddress', 'Utilisateur inconnu')
+            return self._read_profile_email(self.get_service_entry(credentials)) or 'Utilisateur inconnu'
         except Exception:
             return 'Utilisateur connecté'
     
+    def get_profile_email(self, service):
+        """Adresse Gmail du compte du service (mémorisée avec le service de get_gmail_service)
+        
+        Lève une exception si elle ne peut pas être lue : elle sert d'expéditeur.
+        """
+        entry = self._service_entry
+        if entry is not None and entry['service'] is service:
+            email = self._read_profile_email(entry)
+        else:
+            email = service.users().getProfile(userId='me').execute().get('emailAddress')
+        if not email:
+            raise ValueError("Adresse Gmail absente du profil de l'utilisateur")
+        return email
+    
+    def get_email_sender(self, service):
+        """Expéditeur Gmail (GmailSender) du service, réutilisé pour tous les envois de l'utilisateur"""
+        from send_email_final import GmailSender
+        sender_email = self.get_profile_email(service)
+        entry = self._service_entry
+        if entry is None or entry['service'] is not service:
+            return GmailSender(service, sender_email)
+        with entry['lock']:
+            if entry.get('sender') is None:
+                entry['sender'] = GmailSender(service, sender_email)
+            return entry['sender']
+    
     def get_gmail_service(self):
         """Récupère le service Gmail authentifié"""
         credentials = self.load_encrypted_token()
         
         if not credentials:
+            # Credentials externes (scheduler) : ne pas toucher à la session Streamlit partagée
+            if self.external_credentials:
+                print("❌ Credentials externes invalides")
+                return None
             st.error("Session expirée. Veuillez vous reconnecter.")
             st.session_state['authenticated'] = False
             return None
             
         try:
-            # Rafraîchir le token si nécessaire
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
-                self.save_encrypted_token(credentials)
-                
-            service = build('gmail', 'v1', credentials=credentials)
-            return service
+            # Service réutilisé d'un appel à l'autre (token rafraîchi si nécessaire)
+            entry = self.get_service_entry(credentials)
+            if not self.external_credentials and entry['credentials'].token != credentials.token:
+                self.save_encrypted_token(entry['credentials'])
+            
+            self._service_entry = entry
+            return entry['service']
         except Exception as e:
-            st.error(f"Erreur de connexion Gmail: {e}")
+            if self.external_credentials:
+                print(f"❌ Erreur de connexion Gmail: {e}")
+            else:
+                st.error(f"Erreur de connexion Gmail: {e}")
             return None
     
     def logout(self):
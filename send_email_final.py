@@ -2,6 +2,9 @@
 """
 Script final pour envoyer des emails AutoBrief
 Complètement standalone - sans aucune dépendance Streamlit
+
+Utilisable en script (TO_EMAIL, SUBJECT, CONTENT_FILE) ou importé : GmailSender
+envoie plusieurs emails dans le processus courant avec le même service Gmail.
 """
 
 import os
@@ -12,102 +15,131 @@ import base64
 from datetime import datetime
 from email.mime.text import MIMEText
 
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_email_final(to_email, subject, content):
-    """Envoie un email directement via Gmail API"""
+def load_credentials_info():
+    """Credentials Gmail (OAuth2 utilisateur ou Service Account) depuis GOOGLE_CREDENTIALS, ou None"""
+    google_credentials = os.getenv('GOOGLE_CREDENTIALS')
+    if not google_credentials:
+        logger.error("❌ GOOGLE_CREDENTIALS non trouvé dans les variables d'environnement")
+        return None
     
-    try:
-        logger.info(f"📧 Envoi email final pour {to_email}")
-        logger.info(f"📧 Sujet: {subject}")
+    credentials_info = json.loads(google_credentials)
+    
+    # Debug: afficher les champs disponibles
+    logger.info(f"🔍 Champs disponibles dans credentials: {list(credentials_info.keys())}")
+    
+    if 'installed' in credentials_info:
+        # Credentials d'application - on a besoin des credentials OAuth2 de l'utilisateur
+        logger.error("❌ GOOGLE_CREDENTIALS contient les credentials d'application, pas les credentials OAuth2 de l'utilisateur")
+        logger.error("❌ Pour GitHub Actions, vous devez utiliser les credentials OAuth2 de l'utilisateur")
+        logger.error("❌ Récupérez le fichier token.json après authentification dans l'application Streamlit")
+        return None
+    
+    return credentials_info
+
+
+def create_gmail_service(credentials_info):
+    """Construit le service Gmail authentifié et retourne (service, email expéditeur)"""
+    from googleapiclient.discovery import build
+    
+    if credentials_info.get('type') == 'service_account':
+        # Service Account - utiliser les credentials de service
+        logger.info("✅ Service Account détecté - utilisation des credentials de service")
         
-        # Récupérer les credentials Google depuis les variables d'environnement
-        google_credentials = os.getenv('GOOGLE_CREDENTIALS')
-        if not google_credentials:
-            logger.error("❌ GOOGLE_CREDENTIALS non trouvé dans les variables d'environnement")
-            return False
+        from google.oauth2 import service_account
         
-        # Charger les credentials
-        credentials_info = json.loads(google_credentials)
+        credentials = service_account.Credentials.from_service_account_info(
+            credentials_info,
+            scopes=['https://www.googleapis.com/auth/gmail.send']
+        )
+        sender_email = credentials_info.get('client_email', 'noreply@autobrief.com')
+    else:
+        # Credentials OAuth2 de l'utilisateur
+        logger.info("✅ Credentials OAuth2 de l'utilisateur détectés")
         
-        # Debug: afficher les champs disponibles
-        logger.info(f"🔍 Champs disponibles dans credentials: {list(credentials_info.keys())}")
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
         
-        # Vérifier le type de credentials
-        if 'installed' in credentials_info:
-            # Credentials d'application - on a besoin des credentials OAuth2 de l'utilisateur
-            logger.error("❌ GOOGLE_CREDENTIALS contient les credentials d'application, pas les credentials OAuth2 de l'utilisateur")
-            logger.error("❌ Pour GitHub Actions, vous devez utiliser les credentials OAuth2 de l'utilisateur")
-            logger.error("❌ Récupérez le fichier token.json après authentification dans l'application Streamlit")
-            return False
+        credentials = Credentials(
+            token=credentials_info.get('token'),
+            refresh_token=credentials_info.get('refresh_token'),
+            token_uri=credentials_info.get('token_uri', 'https://oauth2.googleapis.com/token'),
+            client_id=credentials_info.get('client_id'),
+            client_secret=credentials_info.get('client_secret')
+        )
         
-        elif 'type' in credentials_info and credentials_info['type'] == 'service_account':
-            # Service Account - utiliser les credentials de service
-            logger.info("✅ Service Account détecté - utilisation des credentials de service")
-            
-            from google.oauth2 import service_account
-            from googleapiclient.discovery import build
-            
-            # Créer les credentials de Service Account
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_info,
-                scopes=['https://www.googleapis.com/auth/gmail.send']
-            )
-            
-            service = build('gmail', 'v1', credentials=credentials)
-            
-        else:
-            # Credentials OAuth2 de l'utilisateur
-            logger.info("✅ Credentials OAuth2 de l'utilisateur détectés")
-            
-            from google.oauth2.credentials import Credentials
-            from google.auth.transport.requests import Request
-            from googleapiclient.discovery import build
-            
-            # Créer les credentials OAuth2
-            credentials = Credentials(
-                token=credentials_info.get('token'),
-                refresh_token=credentials_info.get('refresh_token'),
-                token_uri=credentials_info.get('token_uri', 'https://oauth2.googleapis.com/token'),
-                client_id=credentials_info.get('client_id'),
-                client_secret=credentials_info.get('client_secret')
-            )
+        # Rafraîchir le token si nécessaire
+        if credentials.expired and credentials.refresh_token:
+            credentials.refresh(Request())
+        sender_email = credentials_info.get('email', 'noreply@autobrief.com')
+    
+    return build('gmail', 'v1', credentials=credentials, static_discovery=True, cache_discovery=False), sender_email
+
+
+def build_raw_message(to_email, subject, content, sender_email=None):
+    """Message HTML encodé pour users.messages.send"""
+    message = MIMEText(content, 'html')
+    message['to'] = to_email
+    message['subject'] = subject
+    if sender_email:
+        message['from'] = sender_email
+    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
+
+
+class GmailSender:
+    """Envoi d'emails dans le processus courant avec un service Gmail déjà authentifié
+
+    Le service est construit une seule fois et réutilisé pour tous les envois.
+    Envois en parallèle : seulement avec un service de secure_auth.build_gmail_service,
+    qui utilise un client HTTP par thread.
+    """
+    
+    def __init__(self, service, sender_email=None):
+        self.service = service
+        self.sender_email = sender_email
+    
+    @classmethod
+    def from_credentials_info(cls, credentials_info):
+        service, sender_email = create_gmail_service(credentials_info)
+        return cls(service, sender_email)
+    
+    @classmethod
+    def from_environment(cls):
+        """Expéditeur configuré par GOOGLE_CREDENTIALS, ou None"""
+        credentials_info = load_credentials_info()
+        if not credentials_info:
+            return None
+        return cls.from_credentials_info(credentials_info)
+    
+    def send(self, to_email, subject, content):
+        """Envoie un email HTML et retourne l'ID du message (None en cas d'échec)"""
+        try:
+            logger.info(f"📧 Envoi email pour {to_email}")
+            logger.info(f"📧 Sujet: {subject}")
+            logger.info(f"📧 Email expéditeur: {self.sender_email}")
             
-            # Rafraîchir le token si nécessaire
-            if credentials.expired and credentials.refresh_token:
-                credentials.refresh(Request())
+            body = build_raw_message(to_email, subject, content, self.sender_email)
+            request = self.service.users().messages().send(userId='me', body=body)
+            result = request.execute()
             
-            service = build('gmail', 'v1', credentials=credentials)
-        
-        # Créer le message
-        message = MIMEText(content, 'html')
-        message['to'] = to_email
-        message['subject'] = subject
-        
-        # Déterminer l'email expéditeur selon le type de credentials
-        if 'type' in credentials_info and credentials_info['type'] == 'service_account':
-            # Service Account - utiliser l'email du service account
-            sender_email = credentials_info.get('client_email', 'noreply@autobrief.com')
-        else:
-            # OAuth2 - utiliser l'email de l'utilisateur
-            sender_email = credentials_info.get('email', 'noreply@autobrief.com')
-        
-        message['from'] = sender_email
-        logger.info(f"📧 Email expéditeur: {sender_email}")
-        
-        # Encoder le message
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-        
-        # Envoyer l'email
-        result = service.users().messages().send(
-            userId='me',
-            body={'raw': raw_message}
-        ).execute()
+            logger.info(f"✅ Email envoyé avec succès - Message ID: {result['id']}")
+            return result['id']
+        except Exception as e:
+            logger.error(f"❌ Erreur envoi email: {e}")
+            return None
+
+
+def send_email_final(to_email, subject, content):
+    """Envoie un email directement via Gmail API"""
+    
+    try:
+        logger.info(f"📧 Envoi email final pour {to_email}")
         
-        logger.info(f"✅ Email envoyé avec succès - Message ID: {result['id']}")
-        return True
+        sender = GmailSender.from_environment()
+        if not sender:
+            return False
+        return sender.send(to_email, subject, content) is not None
         
     except Exception as e:
         logger.error(f"❌ Erreur envoi email: {e}")
@@ -158,4 +190,6 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # Configuration du logging (en script seulement : l'import depuis l'application ne la modifie pas)
+    logging.basicConfig(level=logging.INFO)
     main()
@@ -192,6 +192,8 @@ def main():
         st.markdown(f"**Connecté:** {st.session_state.get('user_email', 'Utilisateur')}")
         
         if st.button("Se déconnecter", type="secondary"):
+            # Envoyer les sauvegardes en attente avant de vider la session
+            newsletter_manager.flush_pending_saves()
             auth.logout()
         
         st.markdown("---")
@@ -0,0 +1,126 @@
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken absent : estimation à partir du nombre de caractères
+    tiktoken = None
+
+# Approximation utilisée sans tiktoken (ou si l'encodage ne peut pas être chargé)
+CHARS_PER_TOKEN = 4
+
+# Surcoût de chaque message dans le format chat (rôle, séparateurs)
+TOKENS_PER_MESSAGE = 4
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model):
+    """Retourne l'encodage tiktoken du modèle, ou None s'il est indisponible (chargé une seule fois)"""
+    with _encodings_lock:
+        if model not in _encodings:
+            encoding = None
+            if tiktoken is not None:
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding('cl100k_base')
+                except Exception as e:
+                    # Le fichier BPE est téléchargé au premier usage : pas de réseau, pas d'encodage
+                    print(f"⚠️ DEBUG: Encodage tiktoken indisponible pour {model}, estimation utilisée: {e}")
+            _encodings[model] = encoding
+        return _encodings[model]
+
+
+class TokenBudget:
+    """Compte les tokens d'un modèle et répartit les emails dans sa fenêtre de contexte"""
+
+    def __init__(self, model, context_window, max_output_tokens, max_input_tokens=None):
+        self.model = model
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+        self.max_input_tokens = max_input_tokens
+        self.encoding = get_encoding(model)
+
+    def count(self, text):
+        """Nombre de tokens d'un texte"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def count_messages(self, messages):
+        """Nombre de tokens d'une liste de messages chat"""
+        return sum(self.count(message['content']) + TOKENS_PER_MESSAGE for message in messages) + 3
+
+    def content_budget(self, overhead_tokens):
+        """Tokens disponibles pour le contenu, une fois le prompt et la réponse réservés"""
+        budget = self.context_window - self.max_output_tokens - overhead_tokens
+        if self.max_input_tokens:
+            budget = min(budget, self.max_input_tokens)
+        return max(budget, 0)
+
+    def _slice(self, text, max_tokens):
+        """Découpe brute d'un texte en tranches de max_tokens tokens"""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return [self.encoding.decode(tokens[start:start + max_tokens])
+                    for start in range(0, len(tokens), max_tokens)]
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[start:start + step] for start in range(0, len(text), step)]
+
+    def split(self, text, max_tokens):
+        """Découpe un texte en morceaux d'au plus max_tokens tokens, par paragraphes si possible"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for paragraph in text.split('\n\n'):
+            paragraph_tokens = self.count(paragraph)
+            # Paragraphe trop long : découpe brute par tokens
+            if paragraph_tokens > max_tokens:
+                if current:
+                    chunks.append('\n\n'.join(current))
+                    current, current_tokens = [], 0
+                pieces = self._slice(paragraph, max_tokens)
+                chunks.extend(pieces[:-1])
+                paragraph = pieces[-1]
+                paragraph_tokens = self.count(paragraph)
+            if current and current_tokens + paragraph_tokens > max_tokens:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            if paragraph.strip():
+                current.append(paragraph)
+                current_tokens += paragraph_tokens
+        if current:
+            chunks.append('\n\n'.join(current))
+        return chunks
+
+    def pack(self, texts, max_tokens, separator_tokens=0):
+        """Regroupe des textes (dans l'ordre) en lots tenant dans max_tokens, de façon gloutonne
+
+        Retourne une liste de lots, chaque lot étant une liste de (index du texte, texte).
+        Un texte trop long pour un lot est découpé et réparti sur plusieurs lots.
+        """
+        packs = []
+        current = []
+        current_tokens = 0
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            text_tokens = self.count(text)
+            if text_tokens > max_tokens:
+                if current:
+                    packs.append(current)
+                    current, current_tokens = [], 0
+                for chunk in self.split(text, max_tokens):
+                    packs.append([(index, chunk)])
+                continue
+            if current and current_tokens + separator_tokens + text_tokens > max_tokens:
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append((index, text))
+            current_tokens += text_tokens + separator_tokens
+        if current:
+            packs.append(current)
+        return packs
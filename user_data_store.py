@@ -0,0 +1,542 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from http_client import get_session
+from rate_limiter import backoff_delay
+
+GITHUB_API_URL = 'https://api.github.com'
+
+# Fichier d'index : email -> fichier de l'utilisateur dans le Gist
+INDEX_FILENAME = 'index.json'
+INDEX_VERSION = 1
+
+# Ancien format : tous les utilisateurs dans un seul document (migré puis supprimé au premier accès)
+LEGACY_FILENAME = 'user_data.json'
+
+# L'API Gist ne retourne que les 300 premiers fichiers (Gist marqué truncated) :
+# au plus GIST_MAX_FILES - 1 utilisateurs, index.json compris
+GIST_MAX_FILES = 300
+
+# Écritures concurrentes : nombre maximal de tentatives en cas de conflit
+MAX_WRITE_ATTEMPTS = 8
+
+# Après avoir écrasé une écriture concurrente, tentatives de réparation avant abandon
+# (abandonner perdrait aussi l'écriture écrasée, déjà confirmée à son auteur)
+MAX_REPAIR_ATTEMPTS = 32
+
+# Valeur absente lors d'une fusion
+_MISSING = object()
+
+# Cache HTTP des Gists, partagé par toutes les instances du processus (sessions Streamlit,
+# workers du scheduler) : (url, token) -> (ETag, Gist décodé)
+_gist_cache = {}
+_gist_cache_lock = threading.Lock()
+
+
+class UserDataStoreError(Exception):
+    """Erreur d'accès au stockage des données utilisateur"""
+
+
+def user_filename(user_email):
+    """Nom du fichier d'un utilisateur dans le Gist (empreinte de son email)"""
+    digest = hashlib.sha256(user_email.strip().lower().encode('utf-8')).hexdigest()[:16]
+    return f"user_{digest}.json"
+
+
+def dump_json(data):
+    """Sérialisation compacte des fichiers du Gist"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def merge3(base, ours, theirs):
+    """Fusion à trois voies de documents JSON (dictionnaires fusionnés clé par clé)
+
+    Une valeur modifiée d'un seul côté est conservée ; modifiée des deux côtés,
+    theirs l'emporte. Une clé présente d'un seul côté est conservée : lors d'une
+    réparation, une absence peut venir d'une écriture écrasée plutôt que d'une
+    suppression. Les listes de même longueur sont fusionnées élément par élément.
+    """
+    if theirs is _MISSING:
+        return ours
+    if ours is _MISSING:
+        return theirs
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in list(theirs) + [key for key in ours if key not in theirs]:
+            merged[key] = merge3(base.get(key, _MISSING), ours.get(key, _MISSING), theirs.get(key, _MISSING))
+        return merged
+    if ours == base or theirs == ours:
+        return theirs
+    if theirs == base:
+        return ours
+    if isinstance(base, list) and isinstance(ours, list) and isinstance(theirs, list) and len(base) == len(ours) == len(theirs):
+        return [merge3(*values) for values in zip(base, ours, theirs)]
+    return theirs
+
+
+class UserDataStore(ABC):
+    """Interface de stockage des données utilisateur ({email: données})
+
+    Les implémentations fournissent load_users et update_users ; can_write indique
+    si les écritures sont possibles (ex: Gist sans token).
+    """
+
+    can_write = True
+
+    @abstractmethod
+    def load_users(self, user_emails=None):
+        """Données des utilisateurs demandés (tous si user_emails est None) : {email: données}"""
+
+    @abstractmethod
+    def update_users(self, user_emails, mutator):
+        """Lecture-modification-écriture des utilisateurs demandés
+
+        mutator(email, données actuelles ou None) retourne les nouvelles données
+        (None : utilisateur inchangé). En cas de conflit, mutator est réappliqué
+        sur les données à jour. Selon le stockage, la protection des écritures
+        concurrentes est stricte (SQLite) ou au mieux (Gist, voir GistUserDataStore).
+        """
+
+    def save_users(self, users_data):
+        """Enregistre les données de plusieurs utilisateurs ({email: données})"""
+        return self.update_users(list(users_data), lambda user_email, current: users_data[user_email])
+
+    def load_user(self, user_email):
+        """Données d'un utilisateur (None s'il n'existe pas encore)"""
+        return self.load_users([user_email]).get(user_email)
+
+    def save_user(self, user_email, user_data):
+        """Enregistre les données d'un utilisateur"""
+        return self.save_users({user_email: user_data})
+
+
+class GistUserDataStore(UserDataStore):
+    """Données utilisateur dans un Gist GitHub, un fichier par utilisateur
+
+    Le Gist contient index.json (email -> fichier) et un fichier user_<empreinte>.json
+    par utilisateur : une sauvegarde n'envoie que les fichiers des utilisateurs
+    modifiés, et seuls les fichiers demandés sont décodés à la lecture. Un GET du
+    Gist transfère toutefois le contenu de tous les fichiers (l'API ne permet pas
+    d'en demander un seul) : les requêtes conditionnelles évitent de le refaire
+    tant que rien n'a changé.
+
+    L'API ne retourne que GIST_MAX_FILES fichiers par Gist : au-delà, le Gist est
+    tronqué et toute lecture échoue (UserDataStoreError) plutôt que de traiter les
+    utilisateurs absents de la réponse comme nouveaux. L'ajout d'un utilisateur qui
+    dépasserait cette limite est refusé.
+    """
+
+    def __init__(self, gist_id, token=None, timeout=30):
+        self.gist_id = gist_id
+        self.token = token
+        self.timeout = timeout
+
+    @property
+    def can_write(self):
+        return bool(self.token)
+
+    @property
+    def url(self):
+        return f"{GITHUB_API_URL}/gists/{self.gist_id}"
+
+    def _headers(self):
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if self.token:
+            headers['Authorization'] = f'token {self.token}'
+        return headers
+
+    def _get_gist(self):
+        """Télécharge le Gist (métadonnées et contenu des fichiers)
+
+        Requête conditionnelle (If-None-Match) : sur 304, le Gist déjà décodé est
+        réutilisé, sans transfert ni json.loads du document complet. Le Gist
+        retourné est partagé et ne doit pas être modifié.
+        """
+        cache_key = (self.url, self.token)
+        with _gist_cache_lock:
+            cached = _gist_cache.get(cache_key)
+
+        headers = self._headers()
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        response = get_session().get(self.url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if response.status_code != 200:
+            raise UserDataStoreError(f"Erreur lors de la récupération du Gist: {response.status_code}")
+
+        gist = self._check_complete(response.json())
+        etag = response.headers.get('ETag')
+        if etag:
+            with _gist_cache_lock:
+                _gist_cache[cache_key] = (etag, gist)
+        return gist
+
+    def _patch_files(self, files):
+        """Envoie en un seul PATCH les fichiers modifiés ({nom: contenu}, None : fichier supprimé)"""
+        if not self.token:
+            raise UserDataStoreError("GIST_TOKEN manquant pour écrire dans le Gist")
+        payload = {'files': {
+            filename: None if content is None else {'content': content}
+            for filename, content in files.items()
+        }}
+        response = get_session().patch(self.url, json=payload, headers=self._headers(), timeout=self.timeout)
+        if response.status_code != 200:
+            raise UserDataStoreError(f"Erreur lors de la mise à jour du Gist: {response.status_code}")
+        return response.json()
+
+    def _read_file(self, gist, filename):
+        """Contenu JSON d'un fichier du Gist (None s'il n'existe pas)"""
+        file_info = gist.get('files', {}).get(filename)
+        if not file_info:
+            return None
+        content = file_info.get('content')
+        # Au-delà de 1 Mo, l'API tronque le contenu : le lire depuis raw_url
+        if file_info.get('truncated') and file_info.get('raw_url'):
+            response = get_session().get(file_info['raw_url'], headers=self._headers(), timeout=self.timeout)
+            if response.status_code != 200:
+                raise UserDataStoreError(f"Erreur lors de la lecture de {filename}: {response.status_code}")
+            content = response.text
+        return json.loads(content) if content else {}
+
+    def _load_gist(self):
+        """Télécharge le Gist, après migration de l'ancien format si l'index n'existe pas
+
+        Sans token (lecture seule), l'ancien format est lu tel quel.
+        """
+        gist = self._get_gist()
+        files = gist.get('files', {})
+        if self.token and INDEX_FILENAME not in files:
+            self.migrate(gist)
+            gist = self._get_gist()
+        elif self.token and LEGACY_FILENAME in files:
+            # Gist migré avant que l'ancien fichier ne soit supprimé par la migration
+            self.remove_legacy_file()
+            gist = self._get_gist()
+        return gist
+
+    def _read_index(self, gist):
+        """Index des utilisateurs (email -> fichier)"""
+        return (self._read_file(gist, INDEX_FILENAME) or {}).get('users', {})
+
+    def migrate(self, gist):
+        """Découpe l'ancien user_data.json en un fichier par utilisateur et crée l'index
+
+        user_data.json est supprimé dans le même PATCH : sinon chaque GET du Gist
+        transférerait encore tout l'ancien document (et une copie périmée des tokens
+        chiffrés). Il reste consultable dans l'historique des révisions du Gist.
+        """
+        legacy_data = self._read_file(gist, LEGACY_FILENAME) or {}
+        users = {user_email: user_filename(user_email) for user_email in legacy_data}
+        files = {users[user_email]: dump_json(user_data) for user_email, user_data in legacy_data.items()}
+        files[INDEX_FILENAME] = dump_json({'version': INDEX_VERSION, 'users': users})
+        if LEGACY_FILENAME in gist.get('files', {}):
+            files[LEGACY_FILENAME] = None
+        # Migration concurrente déjà faite par un autre processus : ne rien réécrire
+        if INDEX_FILENAME in self._get_gist().get('files', {}):
+            return
+        try:
+            self._patch_files(files)
+        except UserDataStoreError:
+            # Échec attendu si une migration concurrente a supprimé user_data.json entre-temps
+            if INDEX_FILENAME in self._get_gist().get('files', {}):
+                return
+            raise
+        print(f"✅ DEBUG: Gist migré vers un fichier par utilisateur ({len(users)} utilisateurs)")
+
+    def remove_legacy_file(self):
+        """Supprime l'ancien user_data.json d'un Gist déjà migré (toujours dans l'historique des révisions)"""
+        try:
+            self._patch_files({LEGACY_FILENAME: None})
+            print("✅ DEBUG: Ancien user_data.json supprimé du Gist (conservé dans l'historique des révisions)")
+        except UserDataStoreError as e:
+            print(f"⚠️ DEBUG: Suppression de l'ancien user_data.json impossible: {e}")
+
+    def load_users(self, user_emails=None):
+        gist = self._load_gist()
+        if INDEX_FILENAME not in gist.get('files', {}):
+            legacy_data = self._read_file(gist, LEGACY_FILENAME) or {}
+            if user_emails is None:
+                return legacy_data
+            return {user_email: legacy_data[user_email] for user_email in user_emails if user_email in legacy_data}
+        users = self._read_index(gist)
+        if user_emails is not None:
+            users = {user_email: users[user_email] for user_email in user_emails if user_email in users}
+        all_users_data = {}
+        for user_email, filename in users.items():
+            user_data = self._read_file(gist, filename)
+            if user_data is not None:
+                all_users_data[user_email] = user_data
+        return all_users_data
+
+    def _get_revision(self, version):
+        """Télécharge une révision précise du Gist (immuable)"""
+        response = get_session().get(f"{self.url}/{version}", headers=self._headers(), timeout=self.timeout)
+        if response.status_code != 200:
+            raise UserDataStoreError(f"Erreur lors de la récupération de la révision {version}: {response.status_code}")
+        return self._check_complete(response.json())
+
+    @staticmethod
+    def _check_complete(gist):
+        """Refuse un Gist tronqué par l'API : des fichiers d'utilisateurs manqueraient"""
+        if gist.get('truncated'):
+            raise UserDataStoreError(
+                f"Gist tronqué par l'API GitHub (plus de {GIST_MAX_FILES} fichiers) : "
+                "des utilisateurs de l'index seraient lus comme inexistants"
+            )
+        return gist
+
+    @staticmethod
+    def _version(gist):
+        """Révision courante du Gist"""
+        history = gist.get('history') or [{}]
+        return history[0].get('version')
+
+    @staticmethod
+    def _fingerprints(gist, filenames):
+        """Empreinte du contenu de chaque fichier (None s'il n'existe pas)"""
+        files = gist.get('files', {})
+        return {
+            filename: hashlib.sha256(files[filename].get('content', '').encode('utf-8')).hexdigest()
+            if filename in files else None
+            for filename in filenames
+        }
+
+    def update_users(self, user_emails, mutator):
+        """Écriture optimiste : un seul PATCH des fichiers modifiés, validé avant et après
+
+        L'API Gist n'accepte pas d'écriture conditionnelle (If-Match). Avant le PATCH,
+        une requête conditionnelle vérifie que les fichiers n'ont pas changé depuis la
+        lecture (sinon mutator est réappliqué). Après le PATCH, l'historique retourné
+        indique si une écriture s'est malgré tout intercalée sur les mêmes fichiers :
+        elle a alors été écrasée, et mutator est réappliqué sur la fusion de cette
+        révision avec ce qui a été écrit depuis ; les fichiers réparés sont réécrits
+        même si mutator ne les modifie plus.
+
+        Sans écriture conditionnelle côté GitHub, la garantie reste au mieux : une
+        écriture n'est perdue que si la réparation est abandonnée (MAX_REPAIR_ATTEMPTS
+        conflits) ou si l'écrivain qui l'a écrasée s'arrête avant de la réparer.
+        """
+        clobbered = []  # (révision écrasée, fichiers que nous avons écrits), à chaque conflit
+        attempt = 0
+        while attempt < (MAX_REPAIR_ATTEMPTS if clobbered else MAX_WRITE_ATTEMPTS):
+            current = self._load_gist()
+            source = current
+            for previous, written_files in clobbered:
+                source = self._merge_clobbered(source, previous, written_files)
+
+            files = self._apply_mutator(source, user_emails, mutator)
+            # Fichiers réparés : réécrits même si mutator ne les modifie plus (ex: index.json)
+            for _, written_files in clobbered:
+                for filename in written_files:
+                    if filename not in files and self._read_file(source, filename) != self._read_file(current, filename):
+                        files[filename] = source['files'][filename]['content']
+            if not files:
+                return True
+
+            # Validation avant écriture (304 si rien n'a changé depuis la lecture)
+            expected_version = self._version(current)
+            expected_fingerprints = self._fingerprints(current, files)
+            latest = self._get_gist()
+            if self._version(latest) != expected_version and self._fingerprints(latest, files) != expected_fingerprints:
+                time.sleep(backoff_delay(attempt, base=0.05, cap=1.0))
+                attempt += 1
+                continue
+
+            history = self._patch_files(files).get('history') or []
+
+            # Vérification après écriture : une autre écriture s'est-elle intercalée ?
+            if len(history) < 2 or history[1].get('version') == expected_version:
+                return True
+            previous = self._get_revision(history[1]['version'])
+            if self._fingerprints(previous, files) == expected_fingerprints:
+                # Écritures intercalées sur d'autres fichiers : rien n'a été écrasé
+                return True
+
+            print(f"⚠️ DEBUG: Conflit d'écriture sur le Gist, fusion et nouvelle tentative ({attempt + 1}/{MAX_REPAIR_ATTEMPTS})")
+            clobbered.append((previous, files))
+            time.sleep(backoff_delay(attempt, base=0.05, cap=1.0))
+            attempt += 1
+
+        raise UserDataStoreError("Écriture du Gist abandonnée après plusieurs conflits")
+
+    def _apply_mutator(self, source, user_emails, mutator):
+        """Fichiers à écrire ({nom: contenu}) après application de mutator aux données de source"""
+        users = self._read_index(source)
+        files = {}
+        for user_email in user_emails:
+            # Le nom du fichier ne dépend que de l'email : un fichier absent de l'index (entrée
+            # écrasée par une écriture concurrente, pas encore réparée) est lu quand même
+            filename = users.get(user_email) or user_filename(user_email)
+            current_data = self._read_file(source, filename)
+            new_data = mutator(user_email, current_data)
+            if new_data is None:
+                continue
+            if user_email not in users:
+                if len(set(source.get('files', {})) | set(files) | {INDEX_FILENAME, filename}) > GIST_MAX_FILES:
+                    raise UserDataStoreError(f"Gist plein : {GIST_MAX_FILES} fichiers au plus, nouvel utilisateur refusé")
+                users = dict(users, **{user_email: filename})
+                files[INDEX_FILENAME] = dump_json({'version': INDEX_VERSION, 'users': users})
+            files[filename] = dump_json(new_data)
+        return files
+
+    def _merge_clobbered(self, current, previous, written_files):
+        """Vue du Gist où chaque fichier écrasé par notre écriture est reconstruit
+
+        Fusion à trois voies : base = notre écriture, révision écrasée et version
+        actuelle (modifications faites depuis notre écriture).
+        """
+        files = dict(current.get('files', {}))
+        for filename, written in written_files.items():
+            merged = merge3(
+                json.loads(written),
+                self._read_file(previous, filename) or {},
+                self._read_file(current, filename) or {}
+            )
+            files[filename] = {'filename': filename, 'content': dump_json(merged)}
+        return dict(current, files=files)
+
+
+class SQLiteUserDataStore(UserDataStore):
+    """Données utilisateur dans une base SQLite locale (auto-hébergement, tests hors ligne)
+
+    Une ligne par utilisateur (hors groupes) et une ligne par groupe : mettre à jour
+    un groupe ne réécrit pas les données des autres utilisateurs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        """Ouvre une connexion SQLite (une par opération, utilisable depuis plusieurs threads)"""
+        with self._init_lock:
+            if not self._initialized:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS users (
+                        user_email TEXT PRIMARY KEY,
+                        data TEXT NOT NULL
+                    )
+                """)
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS user_groups (
+                        user_email TEXT NOT NULL,
+                        group_title TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        data TEXT NOT NULL,
+                        PRIMARY KEY (user_email, group_title)
+                    )
+                """)
+                connection.commit()
+                self._initialized = True
+        return connection
+
+    def load_users(self, user_emails=None):
+        connection = self._connect()
+        try:
+            return self._read_users(connection, user_emails)
+        finally:
+            connection.close()
+
+    def update_users(self, user_emails, mutator):
+        """Lecture-modification-écriture dans une transaction (BEGIN IMMEDIATE : écrivains sérialisés)"""
+        connection = self._connect()
+        connection.isolation_level = None
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                users_data = self._read_users(connection, user_emails)
+                for user_email in user_emails:
+                    new_data = mutator(user_email, users_data.get(user_email))
+                    if new_data is not None:
+                        self._write_user(connection, user_email, new_data)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+        return True
+
+    def _read_users(self, connection, user_emails=None):
+        """Données des utilisateurs demandés, lues sur une connexion ouverte"""
+        if user_emails is None:
+            user_rows = connection.execute("SELECT user_email, data FROM users").fetchall()
+            group_rows = connection.execute(
+                "SELECT user_email, data FROM user_groups ORDER BY user_email, position"
+            ).fetchall()
+        else:
+            user_emails = list(user_emails)
+            placeholders = ','.join('?' * len(user_emails))
+            user_rows = connection.execute(
+                f"SELECT user_email, data FROM users WHERE user_email IN ({placeholders})", user_emails
+            ).fetchall()
+            group_rows = connection.execute(
+                f"SELECT user_email, data FROM user_groups WHERE user_email IN ({placeholders}) "
+                "ORDER BY user_email, position", user_emails
+            ).fetchall()
+
+        all_users_data = {}
+        for user_email, data in user_rows:
+            user_data = json.loads(data)
+            user_data['newsletter_groups'] = []
+            all_users_data[user_email] = user_data
+        for user_email, data in group_rows:
+            if user_email in all_users_data:
+                all_users_data[user_email]['newsletter_groups'].append(json.loads(data))
+        return all_users_data
+
+    def _write_user(self, connection, user_email, user_data):
+        """Écrit un utilisateur et ses groupes (seuls les groupes modifiés sont réécrits)"""
+        groups = user_data.get('newsletter_groups', [])
+        fields = {key: value for key, value in user_data.items() if key != 'newsletter_groups'}
+        connection.execute(
+            "INSERT OR REPLACE INTO users (user_email, data) VALUES (?, ?)",
+            (user_email, dump_json(fields))
+        )
+
+        existing = {
+            title: (position, data) for title, position, data in connection.execute(
+                "SELECT group_title, position, data FROM user_groups WHERE user_email = ?", (user_email,)
+            )
+        }
+        titles = set()
+        for position, group in enumerate(groups):
+            title = group.get('title', '')
+            titles.add(title)
+            data = dump_json(group)
+            if existing.get(title) != (position, data):
+                connection.execute(
+                    "INSERT OR REPLACE INTO user_groups (user_email, group_title, position, data) VALUES (?, ?, ?, ?)",
+                    (user_email, title, position, data)
+                )
+        removed = [(user_email, title) for title in existing if title not in titles]
+        connection.executemany("DELETE FROM user_groups WHERE user_email = ? AND group_title = ?", removed)
+
+
+def create_user_data_store(config, gist_id=None):
+    """Stockage configuré (Config.USER_DATA_BACKEND) : 'gist' (défaut) ou 'sqlite'
+
+    Retourne None si le Gist n'est pas configuré.
+    """
+    if config.USER_DATA_BACKEND == 'sqlite':
+        return SQLiteUserDataStore(config.USER_DATA_DB_PATH)
+
+    gist_id = gist_id or config.get_gist_id()
+    if not gist_id:
+        return None
+    return GistUserDataStore(gist_id, config.get_gist_token())